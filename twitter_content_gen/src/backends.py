@@ -0,0 +1,151 @@
+# src/backends.py
+import os
+import re
+
+import config
+
+BACKENDS = ('torch', 'quantized', 'onnx', 'shared')
+QUANTIZED_WEIGHTS = 'quantized_state_dict.pt'
+SHARED_WEIGHTS = 'model.safetensors'
+
+
+def converted_path(model_name: str, backend: str) -> str:
+    """Directory holding the converted artifacts of model_name for backend"""
+    safe_name = re.sub(r'[^\w.-]+', '_', model_name.strip('/'))
+    return os.path.join(config.CONVERTED_MODEL_DIR, f"{safe_name}-{backend}")
+
+
+def _conv1d_to_linear(model):
+    """
+    Swap GPT-2's Conv1D projections for equivalent nn.Linear layers.
+
+    Dynamic quantization only knows nn.Linear; Conv1D is the same affine map
+    with a transposed weight.
+    """
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(module, name, linear)
+    return model
+
+
+def quantize(model):
+    """Dynamically quantize every linear layer of a GPT-2 model to int8"""
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+
+    model = _conv1d_to_linear(model.eval())
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_shared(path: str):
+    """
+    Build GPT-2 around weights memory-mapped read-only from a safetensors file.
+
+    Parameters are allocated without initialisation and never touched, then
+    replaced by tensors viewing the mapped file, so every process loading the
+    same file shares one copy of the weights in the page cache.
+    """
+    from safetensors.torch import load_file
+    from transformers import GPT2Config, GPT2LMHeadModel
+    from transformers.modeling_utils import no_init_weights
+
+    with no_init_weights():
+        model = GPT2LMHeadModel(GPT2Config.from_pretrained(path))
+    model.load_state_dict(load_file(os.path.join(path, SHARED_WEIGHTS)), strict=False, assign=True)
+    # The output projection is stored once, as the tied input embedding
+    model.tie_weights()
+    return model.eval()
+
+
+def load_model(model_name: str, backend: str):
+    """
+    Load model_name for inference on the given backend
+
+    Args:
+        model_name: Hugging Face model name or local checkpoint path
+        backend: One of 'torch', 'quantized', 'onnx' or 'shared'
+
+    Returns:
+        A model exposing generate() and forward() like GPT2LMHeadModel
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+
+    if backend == 'torch':
+        from transformers import GPT2LMHeadModel
+
+        return GPT2LMHeadModel.from_pretrained(model_name)
+
+    path = converted_path(model_name, backend)
+    if backend == 'quantized':
+        import torch
+        from transformers import GPT2Config, GPT2LMHeadModel
+
+        if not os.path.exists(os.path.join(path, QUANTIZED_WEIGHTS)):
+            print(f"No converted model at {path}; quantizing {model_name} in memory "
+                  f"(run convert_model.py --backend quantized to skip this)")
+            return quantize(GPT2LMHeadModel.from_pretrained(model_name))
+        # Rebuild the quantized module structure, then load the stored int8 weights
+        model = quantize(GPT2LMHeadModel(GPT2Config.from_pretrained(path)))
+        model.load_state_dict(torch.load(os.path.join(path, QUANTIZED_WEIGHTS), weights_only=False))
+        return model
+    if backend == 'shared':
+        if not os.path.exists(os.path.join(path, SHARED_WEIGHTS)):
+            raise FileNotFoundError(f"No shared weights at {path}; run convert_model.py --backend shared first")
+        return _load_shared(path)
+
+    try:
+        from optimum.onnxruntime import ORTModelForCausalLM
+    except ImportError:
+        raise ImportError("The onnx backend needs optimum with ONNX Runtime: pip install optimum[onnxruntime]")
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No ONNX export at {path}; run convert_model.py --backend onnx first")
+    return ORTModelForCausalLM.from_pretrained(path, use_cache=True)
+
+
+def convert(model_name: str, backend: str) -> str:
+    """
+    Convert model_name once and store the artifacts under CONVERTED_MODEL_DIR
+
+    Args:
+        model_name: Hugging Face model name or local checkpoint path
+        backend: 'quantized', 'onnx' or 'shared'
+
+    Returns:
+        Directory the converted model was written to
+    """
+    path = converted_path(model_name, backend)
+    os.makedirs(path, exist_ok=True)
+
+    if backend == 'quantized':
+        import torch
+        from transformers import GPT2LMHeadModel
+
+        model = GPT2LMHeadModel.from_pretrained(model_name)
+        model.config.save_pretrained(path)
+        torch.save(quantize(model).state_dict(), os.path.join(path, QUANTIZED_WEIGHTS))
+    elif backend == 'onnx':
+        try:
+            from optimum.onnxruntime import ORTModelForCausalLM
+        except ImportError:
+            raise ImportError("The onnx backend needs optimum with ONNX Runtime: pip install optimum[onnxruntime]")
+        # Exported with past key/values so generation reuses the attention cache
+        model = ORTModelForCausalLM.from_pretrained(model_name, export=True, use_cache=True)
+        model.save_pretrained(path)
+    elif backend == 'shared':
+        from transformers import GPT2LMHeadModel
+
+        GPT2LMHeadModel.from_pretrained(model_name).save_pretrained(path, safe_serialization=True)
+    else:
+        raise ValueError(f"Nothing to convert for backend {backend!r}")
+
+    print(f"Saved {backend} model to {path}")
+    return path
@@ -0,0 +1,361 @@
+# src/benchmarks.py
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+import config
+
+WORDS = ['crypto', 'market', 'build', 'shipping', 'rust', 'python', 'launch', 'today', 'team', 'onchain',
+         'latency', 'users', 'growth', 'thread', 'design', 'agents', 'model', 'open', 'source', 'week']
+HASHTAGS = ['ai', 'web3', 'buildinpublic', 'python', 'defi', 'startups']
+ANNOTATION_DOMAINS = ['Technology', 'Cryptocurrency', 'Business', 'Programming']
+
+# Metrics where a lower value is better; everything else is a throughput
+LOWER_IS_BETTER = ('_ms', '_seconds')
+
+
+def synthetic_texts(count: int, seed: int = 0) -> List[str]:
+    """Tweet-like texts with the URLs, mentions and hashtags the cleaners have to handle"""
+    rng = random.Random(seed)
+    texts = []
+    for i in range(count):
+        words = rng.choices(WORDS, k=rng.randint(6, 30))
+        if rng.random() < 0.5:
+            words.insert(rng.randrange(len(words)), f"https://t.co/{rng.getrandbits(40):x}")
+        if rng.random() < 0.4:
+            words.insert(0, f"@user{rng.randrange(500)}")
+        words += [f"#{tag}" for tag in rng.sample(HASHTAGS, rng.randint(0, 2))]
+        texts.append(f"{' '.join(words)} {i}")
+    return texts
+
+
+def synthetic_tweets(count: int, seed: int = 0) -> pd.DataFrame:
+    """A collected-tweets DataFrame, as collect_tweets returns it"""
+    rng = random.Random(seed)
+    texts = synthetic_texts(count, seed)
+    likes = [rng.randrange(500) for _ in texts]
+    retweets = [rng.randrange(100) for _ in texts]
+    return pd.DataFrame({
+        'id': range(1, count + 1),
+        'username': [f"user{i % 10}" for i in range(count)],
+        'text': texts,
+        'created_at': pd.Timestamp('2024-01-01', tz='UTC'),
+        'likes': likes,
+        'retweets': retweets,
+        'reply_count': 0,
+        'quote_count': 0,
+        'hashtags': [[word[1:] for word in text.split() if word.startswith('#')] for text in texts],
+        'topics': [[rng.choice(ANNOTATION_DOMAINS)] for _ in texts],
+        'engagement': [a + b for a, b in zip(likes, retweets)],
+    })
+
+
+class FakeTwitterClient:
+    """
+    Offline stand-in for the tweepy v2 client, replaying texts as user timelines.
+
+    Implements the calls collection makes (get_users, get_users_tweets and
+    get_tweets) with responses shaped like tweepy's, so collection runs its
+    real pagination and record-building code against it.
+    """
+
+    def __init__(self, texts: Optional[List[str]] = None, tweets_per_user: int = 1000,
+                 latency_seconds: float = 0.0):
+        self.texts = texts or synthetic_texts(1000)
+        self.tweets_per_user = tweets_per_user
+        self.latency_seconds = latency_seconds
+        self.requests = 0
+
+    def _respond(self, data, meta=None):
+        self.requests += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return SimpleNamespace(data=data, meta=meta or {}, includes={}, errors=[])
+
+    def _tweet(self, user_id: int, position: int):
+        text = self.texts[(user_id * 7919 + position) % len(self.texts)]
+        return SimpleNamespace(
+            id=user_id * 10_000_000 + self.tweets_per_user - position,
+            text=text,
+            created_at=datetime(2024, 1, 1, tzinfo=timezone.utc) - timedelta(minutes=position),
+            public_metrics={'like_count': position % 97, 'retweet_count': position % 13,
+                            'reply_count': position % 5, 'quote_count': position % 3},
+            entities={'hashtags': [{'tag': word[1:]} for word in text.split() if word.startswith('#')]},
+            context_annotations=[{'domain': {'name': ANNOTATION_DOMAINS[position % len(ANNOTATION_DOMAINS)]}}],
+        )
+
+    def get_users(self, usernames: List[str], **kwargs):
+        return self._respond([
+            SimpleNamespace(id=1000 + i, username=username, description='', created_at=None,
+                            public_metrics={'followers_count': 0, 'following_count': 0, 'tweet_count': 0})
+            for i, username in enumerate(usernames)
+        ])
+
+    def get_users_tweets(self, id: int, max_results: int = 100, pagination_token: Optional[str] = None,
+                         since_id: Optional[int] = None, **kwargs):
+        start = int(pagination_token or 0)
+        end = min(start + max_results, self.tweets_per_user)
+        tweets = [self._tweet(id, position) for position in range(start, end)]
+        if since_id is not None:
+            tweets = [tweet for tweet in tweets if tweet.id > since_id]
+        return self._respond(tweets, {'next_token': str(end)} if end < self.tweets_per_user and tweets else {})
+
+    def get_tweets(self, ids: List[int], **kwargs):
+        return self._respond([self._tweet(tweet_id // 10_000_000, self.tweets_per_user - tweet_id % 10_000_000)
+                              for tweet_id in ids])
+
+
+def build_tiny_model(path: str, texts: List[str], seed: int = 0) -> str:
+    """
+    Write a small, randomly initialized GPT-2 checkpoint with a tokenizer trained on texts
+
+    Loads like any GPT-2 checkpoint, so the real generation and training code
+    runs on it without downloading anything.
+    """
+    if os.path.exists(os.path.join(path, 'config.json')):
+        return path
+    import torch
+    from tokenizers import ByteLevelBPETokenizer
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+
+    os.makedirs(path, exist_ok=True)
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(texts, vocab_size=1000, special_tokens=['<|endoftext|>'])
+    bpe.save_model(path)
+    tokenizer = GPT2Tokenizer(os.path.join(path, 'vocab.json'), os.path.join(path, 'merges.txt'))
+    tokenizer.save_pretrained(path)
+
+    torch.manual_seed(seed)
+    model = GPT2LMHeadModel(GPT2Config(
+        vocab_size=len(tokenizer), n_positions=256, n_embd=64, n_layer=2, n_head=2,
+        bos_token_id=tokenizer.bos_token_id, eos_token_id=tokenizer.eos_token_id,
+    ))
+    model.save_pretrained(path)
+    return path
+
+
+def _best_seconds(run: Callable[[], object], repeats: int) -> float:
+    # The fastest repeat is the least disturbed by other work on the machine
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_collect(repeats: int, users: int = 8, tweets_per_user: int = 1000) -> Dict[str, float]:
+    from data_collection import collect_tweets
+
+    client = FakeTwitterClient(tweets_per_user=tweets_per_user)
+    usernames = [f"user{i}" for i in range(users)]
+    seconds = _best_seconds(lambda: collect_tweets(usernames, tweet_count=tweets_per_user, client=client),
+                            repeats)
+    return {'tweets_per_second': users * tweets_per_user / seconds}
+
+
+def bench_clean(repeats: int, rows: int = 100_000) -> Dict[str, float]:
+    from preprocessing import clean_texts, clean_tweet
+
+    texts = synthetic_texts(rows)
+    series = pd.Series(texts)
+    return {
+        'clean_tweet_rows_per_second': rows / _best_seconds(lambda: [clean_tweet(t) for t in texts], repeats),
+        'clean_texts_rows_per_second': rows / _best_seconds(lambda: clean_texts(series), repeats),
+    }
+
+
+def bench_prepare(repeats: int, rows: int = 100_000) -> Dict[str, float]:
+    from preprocessing import prepare_training_data
+
+    df = synthetic_tweets(rows)
+    return {'rows_per_second': rows / _best_seconds(lambda: prepare_training_data(df), repeats)}
+
+
+def bench_topics(repeats: int, rows: int = 100_000) -> Dict[str, float]:
+    from tweet_generator import TweetGenerator
+
+    df = synthetic_tweets(rows)
+    # A new generator each time, so the topic index is built from scratch
+    seconds = _best_seconds(lambda: TweetGenerator().extract_topics_and_hashtags(df), repeats)
+    return {'rows_per_second': rows / seconds}
+
+
+def bench_generate(model_path: str, runs: int = 10) -> Dict[str, float]:
+    import torch
+    import metrics
+    from tweet_generator import TweetGenerator
+
+    df = synthetic_tweets(1000)
+    generator = TweetGenerator(model_path, backend='torch', draft_model=None)
+    # One decode per tweet, so reranking and duplicate rejection rounds do not blur decode speed
+    single = dict(n=1, candidates=1, reject_duplicates=False)
+    generator.generate_batch(df, **single)  # Load the model and build the indexes
+    torch.manual_seed(0)
+
+    latencies = []
+    tokens_before = metrics.registry.counter('tweetgen_tokens_generated_total')
+    for _ in range(runs):
+        start = time.perf_counter()
+        generator.generate_batch(df, **single)
+        latencies.append(time.perf_counter() - start)
+    tokens = metrics.registry.counter('tweetgen_tokens_generated_total') - tokens_before
+    latencies.sort()
+    return {
+        'p50_ms': 1000 * latencies[len(latencies) // 2],
+        'mean_ms': 1000 * statistics.mean(latencies),
+        'tokens_per_second': tokens / sum(latencies),
+    }
+
+
+def bench_train(model_path: str, rows: int = 2000) -> Dict[str, float]:
+    from model import TweetGenerator
+
+    generator = TweetGenerator(model_path, backend='torch')
+    dataset = generator.prepare_data(synthetic_texts(rows))
+    start = time.perf_counter()
+    generator.train(dataset)
+    seconds = time.perf_counter() - start
+    steps = math.ceil(len(dataset) / config.BATCH_SIZE) * config.EPOCHS
+    return {'steps_per_second': steps / seconds}
+
+
+BENCHMARKS = ['collect', 'clean', 'prepare', 'topics', 'generate', 'train']
+
+
+def run_benchmarks(names: List[str] = BENCHMARKS, model_path: Optional[str] = None, repeats: int = 3,
+                   workdir: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Run benchmarks offline, inside a scratch working directory
+
+    Every relative path in config (caches, indexes, stores, trainer output)
+    then resolves under workdir, so a run neither reads nor changes project data.
+
+    Args:
+        names: Benchmarks to run, from BENCHMARKS
+        model_path: GPT-2 checkpoint for generate and train (default: a tiny one built in workdir)
+        repeats: Repeats of each throughput measurement; the fastest counts
+        workdir: Scratch directory to keep (default: a temporary one, removed afterwards)
+
+    Returns:
+        Dictionary of benchmark name to its metrics
+    """
+    model_path = os.path.abspath(model_path) if model_path else None
+    scratch = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='tweet-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        if model_path is None and {'generate', 'train'} & set(names):
+            model_path = build_tiny_model(os.path.join(workdir, 'tiny-gpt2'), synthetic_texts(5000))
+        runners = {
+            'collect': lambda: bench_collect(repeats),
+            'clean': lambda: bench_clean(repeats),
+            'prepare': lambda: bench_prepare(repeats),
+            'topics': lambda: bench_topics(repeats),
+            'generate': lambda: bench_generate(model_path),
+            # Last, since training updates the shared copy of the weights that generation uses
+            'train': lambda: bench_train(model_path),
+        }
+        results = {}
+        for name in [name for name in BENCHMARKS if name in names]:
+            print(f"Running {name} benchmark...")
+            results[name] = runners[name]()
+        return results
+    finally:
+        os.chdir(previous)
+        if scratch:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float = config.BENCHMARK_REGRESSION_THRESHOLD) -> List[Dict]:
+    """
+    Compare results to a baseline metric by metric
+
+    Returns:
+        One row per metric present in both, with the relative change and
+        whether it is a regression beyond threshold
+    """
+    rows = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(name, {}).get(metric)
+            if not before:
+                continue
+            change = value / before - 1
+            lower_is_better = metric.endswith(LOWER_IS_BETTER)
+            regressed = change > threshold if lower_is_better else change < -threshold
+            rows.append({'benchmark': name, 'metric': metric, 'baseline': before, 'value': value,
+                         'change': change, 'regression': regressed})
+    return rows
+
+
+def load_baseline(path: str) -> Dict[str, Dict[str, float]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def save_baseline(results: Dict[str, Dict[str, float]], path: str) -> None:
+    """Write results as the new baseline, merged over benchmarks the run did not include"""
+    merged = load_baseline(path) if os.path.exists(path) else {}
+    merged.update(results)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'saved_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                        'cpus': os.cpu_count()},
+            'results': merged,
+        }, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the collection, preprocessing, "
+                                                 "generation and training hot paths")
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help=f"Comma-separated benchmarks to run ({','.join(BENCHMARKS)})")
+    parser.add_argument('--model', default=None,
+                        help="GPT-2 checkpoint for generate and train (default: a tiny random one)")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--baseline', default=config.BENCHMARK_BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=config.BENCHMARK_REGRESSION_THRESHOLD,
+                        help="Relative slowdown that counts as a regression")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run's results as the baseline")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = sorted(set(names) - set(BENCHMARKS))
+    if unknown:
+        parser.error(f"unknown benchmarks {unknown}")
+    baseline_path = os.path.abspath(args.baseline)
+    results = run_benchmarks(names, args.model, args.repeats)
+
+    baseline = load_baseline(baseline_path) if os.path.exists(baseline_path) else {}
+    rows = {(row['benchmark'], row['metric']): row for row in compare(results, baseline, args.threshold)}
+    print(f"\n{'benchmark':<10} {'metric':<28} {'value':>12} {'baseline':>12} {'change':>8}")
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            row = rows.get((name, metric))
+            comparison = (f"{row['baseline']:>12.1f} {row['change']:>+7.1%}{'  REGRESSION' if row['regression'] else ''}"
+                          if row else f"{'-':>12} {'-':>8}")
+            print(f"{name:<10} {metric:<28} {value:>12.1f} {comparison}")
+
+    if args.save_baseline:
+        save_baseline(results, baseline_path)
+        print(f"\nSaved baseline to {baseline_path}")
+    elif any(row['regression'] for row in rows.values()):
+        raise SystemExit(f"\nRegressions beyond {args.threshold:.0%} of {baseline_path}")
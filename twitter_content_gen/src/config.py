@@ -8,9 +8,91 @@ TWITTER_API_KEY = os.getenv('TWITTER_API_KEY')
 TWITTER_API_SECRET = os.getenv('TWITTER_API_SECRET')
 TWITTER_ACCESS_TOKEN = os.getenv('TWITTER_ACCESS_TOKEN')
 TWITTER_ACCESS_TOKEN_SECRET = os.getenv('TWITTER_ACCESS_TOKEN_SECRET')
+# Where API requests go instead of https://api.twitter.com, e.g. http://127.0.0.1:8766 for mock_twitter_api.py
+TWITTER_API_BASE_URL = os.getenv('TWITTER_API_BASE_URL') or None
 
 # Model parameters
 MAX_LENGTH = 280
 MODEL_NAME = 'gpt2'
 BATCH_SIZE = 4
-EPOCHS = 3
\ No newline at end of file
+EPOCHS = 3
+BLOCK_SIZE = 128
+DATASET_CACHE_DIR = 'data/cache/datasets'
+
+# Inference backend: 'torch' (fp32), 'quantized' (dynamic int8), 'onnx' (ONNX Runtime)
+# or 'shared' (fp32 weights memory-mapped from safetensors, shared between processes)
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch')
+CONVERTED_MODEL_DIR = 'models'
+
+# Generation parameters
+GENERATION_BATCH_SIZE = 16
+MAX_NEW_TOKENS = 120  # Upper bound only; decoding normally stops at the character budget
+MIN_TWEET_CHARS = 80
+USE_PREFIX_CACHE = True
+PREFIX_CACHE_SIZE = 32  # Distinct prompt prefixes kept per model
+RERANK_CANDIDATES = 8  # Samples per requested tweet; the best scoring one is kept (1 disables reranking)
+RERANK_SCORE_BATCH_SIZE = 16  # Candidates per scoring forward pass
+RERANK_WEIGHTS = {'fluency': 0.5, 'length': 1.0, 'topics': 1.0}
+# Draft model for speculative decoding, e.g. 'distilgpt2'; unset to decode with the main model only.
+# Assisted decoding runs one sequence at a time, so pair it with RERANK_CANDIDATES = 1 for latency
+SPECULATIVE_DRAFT_MODEL = os.getenv('SPECULATIVE_DRAFT_MODEL') or None
+
+# Worker pool: processes generating from one memory-mapped copy of the weights
+GENERATION_WORKERS = 0  # 0 generates in the calling process
+WORKER_THREADS = None  # Torch threads per worker (default: cores divided by workers)
+
+# Collection parameters
+COLLECTION_WORKERS = 8
+RATE_LIMIT_WINDOW_SECONDS = 15 * 60
+RATE_LIMIT_DEFAULT_REQUESTS = 300  # Per endpoint and window, until the API reports its own budget
+RATE_LIMIT_MAX_RETRIES = 3
+RATE_LIMIT_BACKOFF_BASE = 5
+RATE_LIMIT_BACKOFF_MAX = 15 * 60
+USER_CACHE_PATH = 'data/cache/users.json'
+USER_CACHE_TTL_SECONDS = 24 * 60 * 60
+COLLECTION_CHUNK_SIZE = 500
+WATERMARK_PATH = 'data/cache/watermarks.json'
+METRICS_REFRESH_HOURS = 48
+
+# Local Twitter API stand-in (mock_twitter_api.py)
+MOCK_API_HOST = '127.0.0.1'
+MOCK_API_PORT = 8766
+MOCK_API_LATENCY_MS = 80  # Median; responses follow a long-tailed distribution around it
+MOCK_API_TWEETS_PER_USER = 3200  # The most recent tweets the real timeline endpoint can page through
+MOCK_API_WINDOW_SECONDS = RATE_LIMIT_WINDOW_SECONDS
+
+# Preprocessing parameters
+PREPROCESS_WORKERS = os.cpu_count() or 1
+PREPROCESS_CHUNK_SIZE = 50_000  # Rows cleaned per worker task
+
+# Near-duplicate detection (MinHash signatures with LSH banding)
+DEDUPE_NUM_PERM = 64
+DEDUPE_BANDS = 16  # 4 rows per band: texts around 50% similar become candidates
+DEDUPE_THRESHOLD = 0.7  # Estimated Jaccard similarity above which texts count as duplicates
+DEDUPE_SHINGLE_SIZE = 5
+DEDUPE_MAX_ATTEMPTS = 3  # Generation rounds before giving up on a duplicate-free tweet
+CORPUS_INDEX_PATH = 'data/cache/corpus_index.npz'
+POSTED_INDEX_PATH = 'data/cache/posted_index.npz'
+
+# Storage
+RAW_STORE_PATH = 'data/store/raw'
+GENERATED_STORE_PATH = 'data/store/generated'
+PIPELINE_DIR = 'data/pipeline'  # Stage outputs and manifest of generator.py runs
+
+# Instrumentation
+METRICS_DIR = 'data/metrics'  # Prometheus text files and JSON run summaries
+# Set to a directory to write a cProfile .prof file per generate_tweet / collect_tweets call
+PROFILE_DIR = os.getenv('PROFILE_DIR') or None
+
+# Generation server
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8765
+SERVER_MAX_BATCH_SIZE = GENERATION_BATCH_SIZE
+SERVER_MAX_WAIT_MS = 20
+SERVER_MAX_QUEUE = 64
+SERVER_REQUEST_TIMEOUT = 60
+SERVER_MAX_STREAMS = 4  # Concurrent /generate/stream requests
+
+# Benchmarks
+BENCHMARK_BASELINE_PATH = 'data/benchmarks/baseline.json'
+BENCHMARK_REGRESSION_THRESHOLD = 0.15  # Relative slowdown flagged as a regression
@@ -0,0 +1,115 @@
+# src/convert_model.py
+import argparse
+import os
+import time
+from typing import Dict, List
+
+import backends
+import config
+
+COMPARISON_PROMPTS = [
+    "Generate a tweet: crypto, market, thoughts",
+    "Generate a tweet: startup, launch, users",
+    "Generate a tweet: python, code, weekend",
+    "Generate a tweet: coffee, morning, ideas",
+]
+
+
+def _artifact_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1e6
+
+
+def compare(model_name: str = config.MODEL_NAME, backend_names: List[str] = backends.BACKENDS,
+            max_new_tokens: int = 40) -> List[Dict]:
+    """
+    Compare latency and output quality of inference backends against fp32 torch
+
+    Each backend decodes the same prompts greedily for a fixed number of tokens.
+    Quality is reported as agreement with the torch tokens and as the
+    perplexity of the backend's output under the torch model.
+
+    Args:
+        model_name: Hugging Face model name or local checkpoint path
+        backend_names: Backends to compare
+        max_new_tokens: Tokens decoded per prompt
+
+    Returns:
+        One result dictionary per backend that could be loaded
+    """
+    import torch
+    from transformers import GPT2Tokenizer
+
+    tokenizer = GPT2Tokenizer.from_pretrained(model_name)
+    reference = backends.load_model(model_name, 'torch').eval()
+    encoded = [tokenizer(prompt, return_tensors='pt') for prompt in COMPARISON_PROMPTS]
+
+    def decode(model) -> List:
+        outputs = []
+        for inputs in encoded:
+            with torch.no_grad():
+                output = model.generate(**inputs, do_sample=False, max_new_tokens=max_new_tokens,
+                                        min_new_tokens=max_new_tokens, pad_token_id=tokenizer.eos_token_id)
+            outputs.append(output[0])
+        return outputs
+
+    reference_outputs = decode(reference)
+    results = []
+    for backend in backend_names:
+        try:
+            start = time.perf_counter()
+            model = reference if backend == 'torch' else backends.load_model(model_name, backend)
+            load_seconds = time.perf_counter() - start
+        except (ImportError, FileNotFoundError) as e:
+            print(f"Skipping {backend}: {str(e)}")
+            continue
+
+        decode(model)  # Warm-up
+        start = time.perf_counter()
+        outputs = decode(model)
+        elapsed = time.perf_counter() - start
+
+        matches, losses = 0, []
+        for inputs, output, expected in zip(encoded, outputs, reference_outputs):
+            prompt_length = inputs['input_ids'].shape[1]
+            matches += int((output[prompt_length:] == expected[prompt_length:]).sum())
+            with torch.no_grad():
+                labels = output.unsqueeze(0).clone()
+                labels[:, :prompt_length] = -100
+                losses.append(reference(output.unsqueeze(0), labels=labels).loss.item())
+
+        new_tokens = max_new_tokens * len(encoded)
+        results.append({
+            'backend': backend,
+            'load_seconds': load_seconds,
+            'latency_ms': 1000 * elapsed / len(encoded),
+            'tokens_per_second': new_tokens / elapsed,
+            'token_agreement': matches / new_tokens,
+            'perplexity': float(torch.exp(torch.tensor(losses).mean())),
+            'artifact_mb': _artifact_size_mb(backends.converted_path(model_name, backend))
+        })
+
+    print(f"\n{'backend':<10} {'load s':>7} {'ms/tweet':>9} {'tok/s':>8} {'agree':>6} {'ppl':>8} {'disk MB':>8}")
+    for r in results:
+        print(f"{r['backend']:<10} {r['load_seconds']:>7.2f} {r['latency_ms']:>9.1f} {r['tokens_per_second']:>8.1f} "
+              f"{r['token_agreement']:>6.2f} {r['perplexity']:>8.2f} {r['artifact_mb']:>8.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert GPT-2 for a faster CPU inference backend")
+    parser.add_argument('--model', default=config.MODEL_NAME, help="Model name or checkpoint path")
+    parser.add_argument('--backend', choices=['quantized', 'onnx', 'shared'], action='append',
+                        help="Backend to convert for; may be repeated")
+    parser.add_argument('--compare', action='store_true',
+                        help="Compare latency and output quality of all available backends")
+    args = parser.parse_args()
+
+    for backend in args.backend or []:
+        backends.convert(args.model, backend)
+    if args.compare:
+        compare(args.model)
+    elif not args.backend:
+        parser.print_help()
@@ -3,108 +3,290 @@ import pandas as pd
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-import time
-from typing import List, Dict
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterator, Optional
+import config
+import metrics
+from rate_limit import RateLimitedClient
+from user_cache import UserResolver
+from watermarks import WatermarkStore
+from tweet_store import TweetStore, raw_store
+
+# The v2 timeline endpoint returns between 5 and 100 tweets per page
+MIN_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 100
+
+METRIC_COLUMNS = {
+    'likes': 'like_count',
+    'retweets': 'retweet_count',
+    'reply_count': 'reply_count',
+    'quote_count': 'quote_count'
+}
+
+TWEET_COLUMNS = ['id', 'username', 'text', 'created_at', 'likes', 'retweets', 'reply_count',
+                 'quote_count', 'hashtags', 'topics', 'engagement']
+
+_client = None
+_resolver = None
+_client_lock = threading.Lock()
 
 def setup_twitter_client():
     """
     Set up and return the Twitter API v2 client using credentials from .env file
     """
     load_dotenv()
-    return tweepy.Client(
+    return RateLimitedClient(
         bearer_token=os.getenv('TWITTER_BEARER_TOKEN'),
         consumer_key=os.getenv('TWITTER_API_KEY'),
         consumer_secret=os.getenv('TWITTER_API_SECRET')
     )
 
-def collect_tweets(usernames: List[str], tweet_count: int = 10) -> pd.DataFrame:
+def get_client():
+    """
+    Return the process-wide Twitter client, creating it on first use so all
+    requests share one connection pool and one rate limiter
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = setup_twitter_client()
+        return _client
+
+def get_resolver() -> UserResolver:
+    """
+    Return the process-wide username resolver backed by the on-disk user cache
+    """
+    global _resolver
+    client = get_client()
+    with _client_lock:
+        if _resolver is None:
+            _resolver = UserResolver(client)
+        return _resolver
+
+def _client_and_resolver(client, resolver):
+    # An explicit client (e.g. a fake for tests) gets its own in-memory resolver
+    if client is None:
+        return get_client(), resolver or get_resolver()
+    return client, resolver or UserResolver(client, cache_path=None)
+
+def _tweet_record(username: str, tweet) -> Dict:
+    tweet_data = {
+        'id': tweet.id,
+        'username': username,
+        'text': tweet.text,
+        'created_at': tweet.created_at,
+        'likes': tweet.public_metrics['like_count'],
+        'retweets': tweet.public_metrics['retweet_count'],
+        'reply_count': tweet.public_metrics['reply_count'],
+        'quote_count': tweet.public_metrics['quote_count']
+    }
+    
+    # Extract hashtags if available
+    if hasattr(tweet, 'entities') and tweet.entities and 'hashtags' in tweet.entities:
+        tweet_data['hashtags'] = [tag['tag'] for tag in tweet.entities['hashtags']]
+    else:
+        tweet_data['hashtags'] = []
+        
+    # Extract topics if available
+    if hasattr(tweet, 'context_annotations') and tweet.context_annotations:
+        tweet_data['topics'] = [
+            annotation['domain']['name']
+            for annotation in tweet.context_annotations
+            if 'domain' in annotation
+        ]
+    else:
+        tweet_data['topics'] = []
+        
+    return tweet_data
+
+def _tweets_frame(records: List[Dict]) -> pd.DataFrame:
+    tweets_df = pd.DataFrame(records, columns=TWEET_COLUMNS[:-1])
+    # Convert timestamps to datetime if needed
+    tweets_df['created_at'] = pd.to_datetime(tweets_df['created_at'])
+    tweets_df['engagement'] = tweets_df['likes'] + tweets_df['retweets']
+    return tweets_df
+
+def iter_user_tweets(client, username: str, user_id: int, max_tweets: Optional[int] = None,
+                     start_time: Optional[datetime] = None,
+                     since_id: Optional[int] = None,
+                     stop: Optional[threading.Event] = None) -> Iterator[Dict]:
+    """
+    Yield a user's original tweets page by page, newest first
+    
+    Args:
+        client: Twitter API v2 client
+        username: Twitter username the tweets belong to
+        user_id: ID of that user
+        max_tweets: Stop after this many tweets (default: the whole available timeline)
+        start_time: Stop at tweets older than this time
+        since_id: Only fetch tweets newer than this tweet ID
+        stop: Event that, once set, ends the iteration before the next page request
+        
+    Yields:
+        One record dictionary per tweet
+    """
+    collected = 0
+    pagination_token = None
+    while max_tweets is None or collected < max_tweets:
+        if stop is not None and stop.is_set():
+            return
+        remaining = MAX_PAGE_SIZE if max_tweets is None else max_tweets - collected
+        # Fetch tweets with public metrics
+        tweets = client.get_users_tweets(
+            id=user_id,
+            max_results=min(MAX_PAGE_SIZE, max(MIN_PAGE_SIZE, remaining)),
+            pagination_token=pagination_token,
+            start_time=start_time,
+            since_id=since_id,
+            tweet_fields=['created_at', 'public_metrics', 'context_annotations', 'entities'],
+            exclude=['retweets', 'replies']  # Only get original tweets
+        )
+        
+        for tweet in (tweets.data or [])[:remaining]:
+            yield _tweet_record(username, tweet)
+            collected += 1
+            
+        pagination_token = (tweets.meta or {}).get('next_token')
+        if not tweets.data or not pagination_token:
+            break
+
+def stream_tweets(usernames: List[str], max_tweets: Optional[int] = None,
+                  start_time: Optional[datetime] = None,
+                  chunk_size: int = config.COLLECTION_CHUNK_SIZE, client=None,
+                  max_workers: int = config.COLLECTION_WORKERS,
+                  resolver: UserResolver = None,
+                  since_ids: Optional[Dict[str, Optional[int]]] = None,
+                  completed: Optional[set] = None) -> Iterator[pd.DataFrame]:
     """
-    Collect tweets from specified usernames with rate limit handling
+    Collect tweets from specified usernames concurrently, yielding them in chunks
+    
+    At most about two chunks of tweets are held in memory at any time, however
+    deep the requested history is.
     
     Args:
         usernames: List of Twitter usernames to collect tweets from
-        tweet_count: Number of tweets to collect per user (default: 10)
+        max_tweets: Number of tweets to collect per user (default: all available)
+        start_time: Only collect tweets created after this time
+        chunk_size: Number of tweets per yielded DataFrame
+        client: Client to use instead of the shared one, e.g. a fake for tests
+        max_workers: Number of accounts fetched in parallel
+        resolver: UserResolver to use instead of the shared, disk-cached one
+        since_ids: Per-username tweet ID; only tweets newer than it are collected, all of
+            them regardless of max_tweets
+        completed: Set that receives each username whose collection finished without
+            errors or being stopped
         
-    Returns:
-        pandas.DataFrame containing collected tweets
+    Yields:
+        pandas.DataFrame chunks of collected tweets
     """
-    client = setup_twitter_client()
-    all_tweets = []
+    client, resolver = _client_and_resolver(client, resolver)
+    since_ids = since_ids or {}
+    
+    # Get user IDs (required for v2 API) in bulk, from the cache where possible
+    try:
+        user_ids = resolver.resolve_ids(usernames)
+    except Exception as e:
+        print(f"Error resolving usernames: {str(e)}")
+        return
     
+    found = []
     for username in usernames:
-        try:
-            # Add delay between requests to avoid rate limits
-            time.sleep(2)  # Wait 2 seconds between requests
-            
-            # Get user ID (required for v2 API)
-            user = client.get_user(username=username)
-            if not user.data:
-                print(f"Could not find user: {username}")
+        if user_ids.get(username) is None:
+            print(f"Could not find user: {username}")
+        else:
+            found.append(username)
+    if not found:
+        return
+    
+    records = queue.Queue(maxsize=chunk_size * 2)
+    stop = threading.Event()
+    done = object()
+    
+    def put(item) -> bool:
+        # Give up if the consumer stopped iterating, instead of blocking forever
+        while not stop.is_set():
+            try:
+                records.put(item, timeout=0.1)
+                return True
+            except queue.Full:
                 continue
-                
-            user_id = user.data.id
-            
-            # Add another small delay before fetching tweets
-            time.sleep(1)
-            
-            # Fetch tweets with public metrics
-            tweets = client.get_users_tweets(
-                id=user_id,
-                max_results=tweet_count,
-                tweet_fields=['created_at', 'public_metrics', 'context_annotations', 'entities'],
-                exclude=['retweets', 'replies']  # Only get original tweets
-            )
-            
-            if tweets.data:
-                for tweet in tweets.data:
-                    tweet_data = {
-                        'username': username,
-                        'text': tweet.text,
-                        'created_at': tweet.created_at,
-                        'likes': tweet.public_metrics['like_count'],
-                        'retweets': tweet.public_metrics['retweet_count'],
-                        'reply_count': tweet.public_metrics['reply_count'],
-                        'quote_count': tweet.public_metrics['quote_count']
-                    }
-                    
-                    # Extract hashtags if available
-                    if hasattr(tweet, 'entities') and 'hashtags' in tweet.entities:
-                        tweet_data['hashtags'] = [tag['tag'] for tag in tweet.entities['hashtags']]
-                    else:
-                        tweet_data['hashtags'] = []
-                        
-                    # Extract topics if available
-                    if hasattr(tweet, 'context_annotations'):
-                        tweet_data['topics'] = [
-                            annotation['domain']['name']
-                            for annotation in tweet.context_annotations
-                            if 'domain' in annotation
-                        ]
-                    else:
-                        tweet_data['topics'] = []
-                        
-                    all_tweets.append(tweet_data)
-                    
+        return False
+    
+    def collect_user(username):
+        try:
+            # Accounts still queued when the consumer stops must not spend any quota
+            if stop.is_set():
+                return
+            since_id = since_ids.get(username)
+            # Past a watermark the whole gap is fetched, or the tweets beyond max_tweets would be skipped for good
+            limit = None if since_id is not None else max_tweets
+            for record in iter_user_tweets(client, username, user_ids[username], limit,
+                                           start_time, since_id, stop):
+                if not put(record):
+                    return
+            if stop.is_set():
+                return
+            if completed is not None:
+                completed.add(username)
             print(f"Successfully collected tweets from {username}")
-                    
         except Exception as e:
+            # Rate limits are paced by the client's limiter, so just report and move on
             print(f"Error collecting tweets from {username}: {str(e)}")
-            time.sleep(5)  # Wait longer if we hit an error
-            
-    # Create DataFrame
-    tweets_df = pd.DataFrame(all_tweets)
+        finally:
+            put(done)
     
-    # Add basic preprocessing
-    if not tweets_df.empty:
-        # Convert timestamps to datetime if needed
-        if 'created_at' in tweets_df.columns:
-            tweets_df['created_at'] = pd.to_datetime(tweets_df['created_at'])
-            
-        # Sort by engagement (likes + retweets)
-        tweets_df['engagement'] = tweets_df['likes'] + tweets_df['retweets']
-        tweets_df = tweets_df.sort_values('engagement', ascending=False)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(found))))
+    try:
+        for username in found:
+            executor.submit(collect_user, username)
+        
+        pending = len(found)
+        chunk = []
+        while pending:
+            item = records.get()
+            if item is done:
+                pending -= 1
+                continue
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                metrics.inc('tweetgen_tweets_collected_total', len(chunk))
+                yield _tweets_frame(chunk)
+                chunk = []
+        if chunk:
+            metrics.inc('tweetgen_tweets_collected_total', len(chunk))
+            yield _tweets_frame(chunk)
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+@metrics.profiled('collect_tweets')
+@metrics.timed('tweetgen_function_seconds', function='collect_tweets')
+def collect_tweets(usernames: List[str], tweet_count: int = 10, client=None,
+                   max_workers: int = config.COLLECTION_WORKERS,
+                   resolver: UserResolver = None) -> pd.DataFrame:
+    """
+    Collect tweets from specified usernames concurrently with rate limit handling
     
-    return tweets_df
+    Args:
+        usernames: List of Twitter usernames to collect tweets from
+        tweet_count: Number of tweets to collect per user (default: 10)
+        client: Client to use instead of the shared one, e.g. a fake for tests
+        max_workers: Number of accounts fetched in parallel
+        resolver: UserResolver to use instead of the shared, disk-cached one
+        
+    Returns:
+        pandas.DataFrame containing collected tweets
+    """
+    chunks = list(stream_tweets(usernames, max_tweets=tweet_count, client=client,
+                                max_workers=max_workers, resolver=resolver))
+    if not chunks:
+        return pd.DataFrame()
+    
+    # Sort by engagement (likes + retweets)
+    tweets_df = pd.concat(chunks, ignore_index=True)
+    return tweets_df.sort_values('engagement', ascending=False)
 
 def save_tweets(df: pd.DataFrame, filename: str) -> None:
     """
@@ -122,33 +304,131 @@ def save_tweets(df: pd.DataFrame, filename: str) -> None:
     df.to_csv(file_path, index=False)
     print(f"Saved {len(df)} tweets to {file_path}")
 
-def get_user_info(username: str) -> Dict:
+def backfill_tweets(usernames: List[str], max_tweets: Optional[int] = None,
+                    start_time: Optional[datetime] = None, store: TweetStore = None,
+                    **kwargs) -> int:
+    """
+    Collect deep timelines and flush each chunk to the raw store as it arrives
+    
+    Args:
+        usernames: List of Twitter usernames to collect tweets from
+        max_tweets: Number of tweets to collect per user (default: all available)
+        start_time: Only collect tweets created after this time
+        store: TweetStore to append to instead of the raw store in data/store
+        **kwargs: Passed on to stream_tweets
+        
+    Returns:
+        Number of tweets written
+    """
+    store = store or raw_store()
+    total = 0
+    for chunk in stream_tweets(usernames, max_tweets=max_tweets, start_time=start_time, **kwargs):
+        total += store.append(chunk)
+        print(f"Saved {total} tweets to {store.root}")
+    return total
+
+def refresh_metrics(tweets_df: pd.DataFrame, since: datetime, client=None) -> pd.DataFrame:
+    """
+    Refetch public metrics for tweets created after a given time, 100 IDs per request
+    
+    Args:
+        tweets_df: Corpus of tweets with 'id' and 'created_at' columns
+        since: Tweets created after this time are refreshed
+        client: Client to use instead of the shared one
+        
+    Returns:
+        The corpus with updated likes, retweets, reply/quote counts and engagement
+    """
+    if tweets_df.empty or 'id' not in tweets_df.columns:
+        return tweets_df
+    client = client or get_client()
+    
+    recent = tweets_df['id'].notna() & (tweets_df['created_at'] >= pd.Timestamp(since))
+    tweet_ids = tweets_df.loc[recent, 'id'].astype('int64').tolist()
+    fetched = {}
+    for start in range(0, len(tweet_ids), MAX_PAGE_SIZE):
+        try:
+            response = client.get_tweets(ids=tweet_ids[start:start + MAX_PAGE_SIZE],
+                                         tweet_fields=['public_metrics'])
+        except Exception as e:
+            print(f"Error refreshing tweet metrics: {str(e)}")
+            break
+        for tweet in response.data or []:
+            fetched[tweet.id] = tweet.public_metrics
+    if not fetched:
+        return tweets_df
+    
+    tweets_df = tweets_df.copy()
+    for column, metric in METRIC_COLUMNS.items():
+        updated = tweets_df['id'].map(lambda tweet_id: fetched.get(tweet_id, {}).get(metric))
+        tweets_df[column] = updated.fillna(tweets_df[column]).astype('int64')
+    tweets_df['engagement'] = tweets_df['likes'] + tweets_df['retweets']
+    print(f"Refreshed metrics for {len(fetched)} recent tweets")
+    return tweets_df
+
+@metrics.timed('tweetgen_function_seconds', function='collect_new_tweets')
+def collect_new_tweets(usernames: List[str], max_tweets: int = 100,
+                       refresh_hours: float = config.METRICS_REFRESH_HOURS, client=None,
+                       resolver: UserResolver = None, watermarks: WatermarkStore = None,
+                       store: TweetStore = None) -> int:
+    """
+    Collect only tweets newer than each account's watermark and append them to the raw store
+    
+    Args:
+        usernames: List of Twitter usernames to collect tweets from
+        max_tweets: Maximum number of tweets to collect per user on its first run; accounts
+            with a watermark are always collected up to it, so no tweet is skipped
+        refresh_hours: Refresh engagement metrics for tweets younger than this (0 to skip)
+        client: Client to use instead of the shared one, e.g. a fake for tests
+        resolver: UserResolver to use instead of the shared, disk-cached one
+        watermarks: WatermarkStore to use instead of the one in data/cache
+        store: TweetStore to append to instead of the raw store in data/store
+        
+    Returns:
+        Number of new tweets collected
+    """
+    watermarks = watermarks or WatermarkStore()
+    store = store or raw_store()
+    
+    new_count = 0
+    completed = set()
+    newest = []
+    for chunk in stream_tweets(usernames, max_tweets=max_tweets, client=client, resolver=resolver,
+                               since_ids=watermarks.since_ids(usernames), completed=completed):
+        new_count += store.append(chunk)
+        newest.append(chunk.loc[chunk.groupby('username')['id'].idxmax()])
+    # Only accounts collected without errors move on, so a failed run is retried from the old mark
+    if newest:
+        newest_df = pd.concat(newest)
+        watermarks.advance_from(newest_df[newest_df['username'].isin(completed)])
+    watermarks.save()
+    print(f"Collected {new_count} new tweets")
+    
+    if refresh_hours:
+        since = pd.Timestamp.now(tz='UTC') - pd.Timedelta(hours=refresh_hours)
+        recent_df = store.read(usernames=usernames, since=since)
+        refreshed_df = refresh_metrics(recent_df, since, client=client)
+        # Only rows whose metrics moved need a newer copy in the append-only store
+        changed = (refreshed_df[list(METRIC_COLUMNS)] != recent_df[list(METRIC_COLUMNS)]).any(axis=1)
+        store.append(refreshed_df[changed])
+    
+    return new_count
+
+def get_user_info(username: str, client=None, resolver: UserResolver = None) -> Dict:
     """
     Get detailed information about a Twitter user
     
     Args:
         username: Twitter username
+        client: Client to use instead of the shared one
+        resolver: UserResolver to use instead of the shared, disk-cached one
         
     Returns:
         Dictionary containing user information
     """
-    client = setup_twitter_client()
+    client, resolver = _client_and_resolver(client, resolver)
     try:
-        user = client.get_user(
-            username=username,
-            user_fields=['description', 'public_metrics', 'created_at']
-        )
-        
-        if user.data:
-            return {
-                'id': user.data.id,
-                'username': username,
-                'description': user.data.description,
-                'followers_count': user.data.public_metrics['followers_count'],
-                'following_count': user.data.public_metrics['following_count'],
-                'tweet_count': user.data.public_metrics['tweet_count'],
-                'created_at': user.data.created_at
-            }
+        return resolver.get_profiles([username])[username]
             
     except Exception as e:
         print(f"Error getting info for user {username}: {str(e)}")
@@ -0,0 +1,80 @@
+# src/generation_client.py
+import json
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Iterator, List
+
+import config
+
+
+class GenerationClient:
+    """
+    Client for the local generation server (see generation_server.py).
+
+    Retries when the server reports it is busy, honouring Retry-After.
+    """
+
+    def __init__(self, base_url: str = f"http://{config.SERVER_HOST}:{config.SERVER_PORT}",
+                 timeout: float = config.SERVER_REQUEST_TIMEOUT, max_retries: int = 3):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    def _request(self, path: str, body: Dict = None) -> Dict:
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(
+            self.base_url + path, data=data,
+            headers={'Content-Type': 'application/json'} if data else {}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def health(self) -> Dict:
+        return self._request('/health')
+
+    def generate(self, n: int = 1) -> List[Dict]:
+        """
+        Request n tweets from the server
+
+        Args:
+            n: Number of tweets to generate
+
+        Returns:
+            List of result dicts in the same format as TweetGenerator.generate_tweet
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._request('/generate', {'n': n})['tweets']
+            except urllib.error.HTTPError as e:
+                if e.code != 503 or attempt == self.max_retries:
+                    raise
+                time.sleep(float(e.headers.get('Retry-After', 1)))
+
+    def stream(self) -> Iterator[str]:
+        """
+        Stream one tweet from the server, yielding cleaned text pieces as they are decoded
+
+        Raises:
+            RuntimeError: If generation fails after the stream has started
+        """
+        for attempt in range(self.max_retries + 1):
+            request = urllib.request.Request(self.base_url + '/generate/stream', data=b'{}',
+                                             headers={'Content-Type': 'application/json'})
+            try:
+                response = urllib.request.urlopen(request, timeout=self.timeout)
+            except urllib.error.HTTPError as e:
+                if e.code != 503 or attempt == self.max_retries:
+                    raise
+                time.sleep(float(e.headers.get('Retry-After', 1)))
+                continue
+
+            with response:
+                for line in response:
+                    event = json.loads(line)
+                    if 'error' in event:
+                        raise RuntimeError(event['error'])
+                    if event.get('done'):
+                        return
+                    yield event['text']
+            return
@@ -0,0 +1,296 @@
+# src/generation_server.py
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import config
+import metrics
+import model_registry
+from topic_index import TopicIndex
+from tweet_generator import TweetGenerator
+
+
+class _Request:
+    def __init__(self, n: int):
+        self.n = n
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class DynamicBatcher:
+    """
+    Collects concurrent generation requests into batches for one model.
+
+    A batch is dispatched as soon as it holds max_batch_size tweets, or once
+    the oldest request in it has waited max_wait_ms. The queue is bounded so
+    callers get an immediate rejection instead of unbounded latency.
+    """
+
+    def __init__(self, generator: TweetGenerator, index: TopicIndex,
+                 max_batch_size: int = config.SERVER_MAX_BATCH_SIZE,
+                 max_wait_ms: float = config.SERVER_MAX_WAIT_MS,
+                 max_queue: int = config.SERVER_MAX_QUEUE):
+        self.generator = generator
+        self.index = index
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._held: Optional[_Request] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='generation-batcher', daemon=True)
+        self.batches_run = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, n: int = 1) -> Future:
+        """Queue a request for n tweets; raises queue.Full when the server is saturated"""
+        request = _Request(n)
+        self._queue.put_nowait(request)
+        return request.future
+
+    def _next_batch(self) -> List[_Request]:
+        first = self._held
+        self._held = None
+        while first is None:
+            if self._stop.is_set():
+                return []
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+        batch = [first]
+        size = first.n
+        deadline = first.enqueued_at + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + request.n > self.max_batch_size:
+                # Does not fit; it opens the next batch instead
+                self._held = request
+                break
+            batch.append(request)
+            size += request.n
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                results = self.generator.generate_batch(
+                    self.index, n=sum(request.n for request in batch),
+                    batch_size=self.max_batch_size
+                )
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            self.batches_run += 1
+            start = 0
+            for request in batch:
+                request.future.set_result(results[start:start + request.n])
+                start += request.n
+
+
+def make_handler(batcher: DynamicBatcher, model_name: str,
+                 request_timeout: float = config.SERVER_REQUEST_TIMEOUT,
+                 max_streams: int = config.SERVER_MAX_STREAMS):
+    # Streams decode outside the batcher for the lowest time to first token, so they are capped separately
+    stream_slots = threading.BoundedSemaphore(max_streams)
+    workers = getattr(batcher.generator, 'workers', 0)
+
+    class GenerationHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send_json(self, status: int, body: dict, headers: Optional[dict] = None) -> None:
+            payload = json.dumps(body, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                payload = metrics.registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+            if self.path != '/health':
+                self._send_json(404, {'error': 'Not found'})
+                return
+            self._send_json(200, {
+                'status': 'ok',
+                'model': model_name,
+                'backend': config.INFERENCE_BACKEND,
+                # Worker pools only report ready once every worker has loaded the model
+                'model_loaded': workers > 0 or model_registry.is_loaded(model_name),
+                'workers': workers,
+                'queue_depth': batcher.queue_depth,
+                'batches_run': batcher.batches_run,
+                'topics': len(batcher.index)
+            })
+
+        def _send_chunk(self, event: dict) -> None:
+            payload = json.dumps(event, default=str).encode('utf-8') + b'\n'
+            self.wfile.write(f"{len(payload):x}\r\n".encode('ascii') + payload + b'\r\n')
+            self.wfile.flush()
+
+        def _stream(self) -> None:
+            # The body carries no options, but unread bytes would be parsed as the next keep-alive request
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if workers:
+                # Streaming decodes token by token in this process, which a worker pool does not load
+                self._send_json(501, {'error': 'Streaming is not available with generation workers'})
+                return
+            if not stream_slots.acquire(blocking=False):
+                self._send_json(503, {'error': 'Server busy, try again later'}, {'Retry-After': '1'})
+                return
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                # One JSON event per line: text pieces, then a final done or error event
+                pieces = []
+                try:
+                    for piece in batcher.generator.stream_tweet(batcher.index):
+                        pieces.append(piece)
+                        self._send_chunk({'text': piece})
+                    self._send_chunk({'done': True, 'tweet': ''.join(pieces)})
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                except Exception as e:
+                    self._send_chunk({'error': f"Error generating tweet: {str(e)}"})
+                self.wfile.write(b'0\r\n\r\n')
+            finally:
+                stream_slots.release()
+
+        def do_POST(self):
+            if self.path == '/generate/stream':
+                self._stream()
+                return
+            if self.path != '/generate':
+                self._send_json(404, {'error': 'Not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                n = int(body.get('n', 1))
+            except (ValueError, TypeError) as e:
+                self._send_json(400, {'error': f"Invalid request: {str(e)}"})
+                return
+            if not 1 <= n <= batcher.max_batch_size:
+                self._send_json(400, {'error': f"n must be between 1 and {batcher.max_batch_size}"})
+                return
+
+            try:
+                future = batcher.submit(n)
+            except queue.Full:
+                self._send_json(503, {'error': 'Server busy, try again later'}, {'Retry-After': '1'})
+                return
+            try:
+                tweets = future.result(timeout=request_timeout)
+            except TimeoutError:
+                self._send_json(504, {'error': 'Generation timed out'})
+                return
+            except Exception as e:
+                self._send_json(500, {'error': f"Error generating tweet: {str(e)}"})
+                return
+            self._send_json(200, {'tweets': tweets})
+
+        def log_message(self, format, *args):
+            # Keep per-request access logs out of the scheduler output
+            pass
+
+    return GenerationHandler
+
+
+def serve(host: str = config.SERVER_HOST, port: int = config.SERVER_PORT,
+          model_name: str = config.MODEL_NAME, index: Optional[TopicIndex] = None,
+          max_batch_size: int = config.SERVER_MAX_BATCH_SIZE,
+          max_wait_ms: float = config.SERVER_MAX_WAIT_MS,
+          max_queue: int = config.SERVER_MAX_QUEUE,
+          workers: int = config.GENERATION_WORKERS) -> None:
+    """
+    Run the generation service until interrupted
+
+    Args:
+        host: Interface to bind to
+        port: Port to listen on
+        model_name: Model name or checkpoint path to keep resident
+        index: Topic index to generate from (default: built from the raw store)
+        max_batch_size: Maximum number of tweets decoded together
+        max_wait_ms: Longest a request waits for others to join its batch
+        max_queue: Requests queued beyond this are rejected with 503
+        workers: Generate in this many worker processes sharing memory-mapped
+            weights (0 generates in the server process); streaming is only
+            served without workers
+    """
+    if index is None:
+        from tweet_store import raw_store
+
+        index = TopicIndex.from_store(raw_store())
+    if workers:
+        from worker_pool import WorkerPool
+
+        generator = WorkerPool(model_name, workers).start()
+    else:
+        model_registry.warm(model_name)
+        generator = TweetGenerator(model_name)
+
+    batcher = DynamicBatcher(generator, index, max_batch_size, max_wait_ms, max_queue)
+    batcher.start()
+    server = ThreadingHTTPServer((host, port), make_handler(batcher, model_name))
+    print(f"Serving tweet generation on http://{host}:{port} ({len(index)} topics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down generation server...")
+    finally:
+        server.server_close()
+        batcher.stop()
+        if workers:
+            generator.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve tweet generation over local HTTP")
+    parser.add_argument('--host', default=config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT)
+    parser.add_argument('--model', default=config.MODEL_NAME, help="Model name or checkpoint path")
+    parser.add_argument('--max-batch-size', type=int, default=config.SERVER_MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=config.SERVER_MAX_WAIT_MS)
+    parser.add_argument('--max-queue', type=int, default=config.SERVER_MAX_QUEUE)
+    parser.add_argument('--workers', type=int, default=config.GENERATION_WORKERS,
+                        help="Worker processes sharing memory-mapped weights (0 generates in the server)")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.model, max_batch_size=args.max_batch_size,
+          max_wait_ms=args.max_wait_ms, max_queue=args.max_queue, workers=args.workers)
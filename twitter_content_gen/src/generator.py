@@ -1,27 +1,120 @@
 # src/generator.py
-from data_collection import collect_tweets, save_tweets
-from preprocessing import prepare_training_data, create_training_sets
+import argparse
+import hashlib
+import os
+import shutil
+
+import pandas as pd
+
+import config
+import metrics
+import model_registry
+from data_collection import collect_new_tweets
+from preprocessing import load_training_data, create_training_sets
 from model import TweetGenerator
+from pipeline import Pipeline, Stage, hash_files
+from tweet_store import raw_store
+
+STAGES = ['collect', 'preprocess', 'tokenize', 'train', 'generate']
+
+
+def build_pipeline(usernames, model_name=config.MODEL_NAME, root=config.PIPELINE_DIR):
+    """
+    Collection, preprocessing, tokenization, fine-tuning and generation as cached stages
+
+    Each stage is keyed on the content of what it consumes, so e.g. a
+    collection run that found no new tweets skips straight to generation
+    with the already trained checkpoint.
+    """
+    def collect(inputs, workdir):
+        collect_new_tweets(usernames)
+        return raw_store().fingerprint()
+
+    def preprocess(inputs, workdir):
+        df = load_training_data(usernames=usernames)
+        path = os.path.join(workdir, 'training.parquet')
+        df.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+        # Keyed on the kept texts only, so engagement updates alone do not trigger retraining
+        content = pd.util.hash_pandas_object(df.sort_values('id')[['id', 'cleaned_text']], index=False)
+        return {'path': path, 'rows': len(df), 'hash': hashlib.sha256(content.to_numpy().tobytes()).hexdigest()}
+
+    def tokenize(inputs, workdir):
+        # Split in id order, so the split depends on the texts and not on their engagement ranking
+        df = pd.read_parquet(inputs['preprocess']['path']).sort_values('id')
+        train_texts, test_texts = create_training_sets(df)
+        dataset = TweetGenerator(model_name, backend='torch').prepare_data(train_texts)
+        return {'dataset': dataset.cache_path, 'train': len(train_texts), 'test': len(test_texts)}
+
+    def train(inputs, workdir):
+        from training_data import PackedTweetDataset
 
-def main():
-    # 1. Collect data
+        generator = TweetGenerator(model_name, backend='torch')  # Fine-tuning needs full-precision weights
+        generator.train(PackedTweetDataset.load(inputs['tokenize']['dataset']))
+        checkpoint = os.path.join(workdir, 'model')
+        shutil.rmtree(checkpoint, ignore_errors=True)
+        generator.save(checkpoint)
+        return {'checkpoint': checkpoint, 'hash': hash_files(checkpoint)}
+
+    def generate(inputs, workdir):
+        generator = TweetGenerator(inputs['train']['checkpoint'], backend='torch')
+        tweets = []
+        for _ in range(5):
+            tweet = generator.generate_tweet()
+            print(f"Generated Tweet: {tweet}\n")
+            tweets.append(tweet)
+        return tweets
+
+    return Pipeline([
+        Stage('collect', collect, always_run=True),
+        Stage('preprocess', preprocess, inputs=['collect'], params={'usernames': sorted(usernames)},
+              fingerprint=lambda output: output['hash']),
+        Stage('tokenize', tokenize, inputs=['preprocess'],
+              params={'model': model_name, 'block_size': config.BLOCK_SIZE}),
+        Stage('train', train, inputs=['tokenize'],
+              params={'model': model_name, 'epochs': config.EPOCHS, 'batch_size': config.BATCH_SIZE},
+              fingerprint=lambda output: output['hash']),
+        Stage('generate', generate, inputs=['train'], always_run=True),
+    ], root=root)
+
+
+def main(model_name=config.MODEL_NAME, stages=None, force=()):
     usernames = ['Param_eth', 'AayushStack', 'uttam_singhk']  # Add your target accounts
-    tweets_df = collect_tweets(usernames)
-    save_tweets(tweets_df, 'raw_tweets.csv')
-    
-    # 2. Preprocess data
-    processed_df = prepare_training_data(tweets_df)
-    train_texts, test_texts = create_training_sets(processed_df)
-    
-    # 3. Initialize and train model
-    generator = TweetGenerator()
-    train_dataset = generator.prepare_data(train_texts)
-    generator.train(train_dataset)
-    
-    # 4. Generate tweets
-    for _ in range(5):
-        tweet = generator.generate_tweet()
-        print(f"Generated Tweet: {tweet}\n")
+    try:
+        build_pipeline(usernames, model_name).run(only=stages, force=force)
+    finally:
+        # Also written for failed runs, which are the ones worth looking at
+        metrics.registry.export('generator')
+
+
+def _stage_list(value):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in STAGES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stages {unknown}; choose from {', '.join(STAGES)}")
+    return names
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Collect tweets, fine-tune GPT-2 and generate new tweets")
+    parser.add_argument('--warm-only', action='store_true',
+                        help="Only load the model into this process, e.g. to prime the download cache")
+    parser.add_argument('--model', default=config.MODEL_NAME, help="Model name or checkpoint path")
+    parser.add_argument('--stages', type=_stage_list, default=None,
+                        help=f"Comma-separated stages to run ({','.join(STAGES)}); the others reuse "
+                             f"their last recorded outputs")
+    parser.add_argument('--force', type=_stage_list, default=[],
+                        help="Comma-separated stages to rerun even if their inputs are unchanged")
+    parser.add_argument('--status', action='store_true', help="Show when each stage last completed and exit")
+    args = parser.parse_args()
+
+    if args.warm_only:
+        model_registry.warm(args.model)
+    elif args.status:
+        status = build_pipeline([], args.model).status()
+        for name in STAGES:
+            record = status.get(name)
+            print(f"{name:<11} " + (f"{record['completed_at']}  {record['seconds']:.1f}s  {record['fingerprint'][:12]}"
+                                    if record else "never run"))
+    else:
+        main(args.model, args.stages, args.force)
@@ -0,0 +1,278 @@
+# src/metrics.py
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence, Tuple
+
+import config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Upper bounds in seconds, from a cached API call up to a full fine-tuning stage
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, object]) -> _Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _series(name: str, labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return name
+    return name + '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in pairs) + '}'
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def peak_rss_bytes(children: bool = False) -> Optional[int]:
+    """Peak resident set size of this process (or of its finished children), None where unknown"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float, count: int) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += count
+                break
+        self.sum += value * count
+        self.count += count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (inf past the last bucket)"""
+        if not self.count:
+            return None
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and histograms for one process.
+
+    Recording is a dictionary update under a lock, cheap enough to leave on
+    in production. Series are named like Prometheus metrics and keyed by
+    their labels, and are exported as Prometheus text or a JSON run summary.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[_Key, float] = {}
+        self._gauges: Dict[_Key, float] = {}
+        self._histograms: Dict[_Key, _Histogram] = {}
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def counter(self, name: str, **labels) -> float:
+        """Current value of a counter series, 0 if it was never incremented"""
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0.0)
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, count: int = 1, buckets: Sequence[float] = DEFAULT_BUCKETS,
+                **labels) -> None:
+        """Record value in a histogram, count times (e.g. once per tweet of a batch)"""
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value, count)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the seconds spent in the with-block, including when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str, **labels):
+        """Decorator form of timer()"""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+    def _resource_gauges(self) -> None:
+        for name, children in (('tweetgen_peak_rss_bytes', False), ('tweetgen_children_peak_rss_bytes', True)):
+            value = peak_rss_bytes(children)
+            if value is not None:
+                self.set_gauge(name, value)
+
+    def to_prometheus(self) -> str:
+        """All series in the Prometheus text exposition format"""
+        self._resource_gauges()
+        lines = []
+        with self._lock:
+            for kind, series in (('counter', self._counters), ('gauge', self._gauges)):
+                typed = set()
+                for (name, labels), value in sorted(series.items()):
+                    if name not in typed:
+                        lines.append(f"# TYPE {name} {kind}")
+                        typed.add(name)
+                    lines.append(f"{_series(name, labels)} {_number(value)}")
+            typed = set()
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{_series(name + '_bucket', labels, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{_series(name + '_bucket', labels, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{_series(name + '_sum', labels)} {_number(histogram.sum)}")
+                lines.append(f"{_series(name + '_count', labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, job: str) -> Dict:
+        """JSON-serializable summary of the run so far"""
+        self._resource_gauges()
+        now = time.time()
+        with self._lock:
+            return {
+                'job': job,
+                'started_at': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec='seconds'),
+                'finished_at': datetime.fromtimestamp(now, timezone.utc).isoformat(timespec='seconds'),
+                'duration_seconds': round(now - self.started_at, 3),
+                'counters': {_series(name, labels): value for (name, labels), value in sorted(self._counters.items())},
+                'gauges': {_series(name, labels): value for (name, labels), value in sorted(self._gauges.items())},
+                'histograms': {
+                    _series(name, labels): {
+                        'count': h.count,
+                        'sum': round(h.sum, 6),
+                        'mean': round(h.sum / h.count, 6) if h.count else None,
+                        'p50_le': h.quantile(0.5),
+                        'p90_le': h.quantile(0.9),
+                        'p99_le': h.quantile(0.99),
+                    }
+                    for (name, labels), h in sorted(self._histograms.items())
+                },
+            }
+
+    def export(self, job: str, directory: str = config.METRICS_DIR) -> Tuple[str, str]:
+        """
+        Write <job>.prom (overwritten each run, e.g. for node_exporter's textfile
+        collector) and a timestamped <job>-<time>.json run summary
+
+        Returns:
+            Tuple of (Prometheus file path, JSON summary path)
+        """
+        os.makedirs(directory, exist_ok=True)
+        prom_path = os.path.join(directory, f"{job}.prom")
+        with open(f"{prom_path}.tmp", 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(f"{prom_path}.tmp", prom_path)
+
+        summary = self.summary(job)
+        json_path = os.path.join(directory, f"{job}-{time.strftime('%Y%m%dT%H%M%S')}.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, default=str)
+        print(f"Wrote metrics to {prom_path} and {json_path}")
+        return prom_path, json_path
+
+
+# Process-wide registry that the instrumented modules record into
+registry = MetricsRegistry()
+inc = registry.inc
+set_gauge = registry.set_gauge
+observe = registry.observe
+timer = registry.timer
+timed = registry.timed
+
+_profiling = threading.local()
+_profile_count = 0
+_profile_lock = threading.Lock()
+
+
+def profiled(name: str):
+    """
+    Decorator profiling each call with cProfile when config.PROFILE_DIR is set
+
+    Every call writes <PROFILE_DIR>/<name>-<pid>-<n>.prof, readable with
+    pstats or snakeviz. Calls nested inside a profiled call are covered by
+    the outer profile. With PROFILE_DIR unset the wrapper only checks the
+    setting, so sampling profilers like py-spy see the undisturbed function.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            directory = config.PROFILE_DIR
+            if not directory or getattr(_profiling, 'active', False):
+                return function(*args, **kwargs)
+
+            global _profile_count
+            with _profile_lock:
+                _profile_count += 1
+                path = os.path.join(directory, f"{name}-{os.getpid()}-{_profile_count}.prof")
+            profiler = cProfile.Profile()
+            _profiling.active = True
+            try:
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another thread is already profiling; Python allows one profiler at a time
+                    return function(*args, **kwargs)
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                    os.makedirs(directory, exist_ok=True)
+                    profiler.dump_stats(path)
+            finally:
+                _profiling.active = False
+        return wrapper
+    return decorate
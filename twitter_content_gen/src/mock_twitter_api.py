@@ -0,0 +1,290 @@
+# src/mock_twitter_api.py
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import config
+from benchmarks import ANNOTATION_DOMAINS, HASHTAGS, WORDS
+from rate_limit import endpoint_key
+
+# Requests per window for each endpoint, as the v2 API grants an app using a bearer token
+RATE_LIMITS = {
+    'GET /2/users/by': 300,
+    'GET /2/users/by/username/:username': 300,
+    'GET /2/users/:id/tweets': 1500,
+    'GET /2/tweets': 300,
+}
+
+TWEET_INTERVAL_SECONDS = 3600  # Time between consecutive synthetic tweets of one account
+_TWEET_ID_STRIDE = 10_000_000  # Tweet IDs are user_id * stride + timeline position from the oldest
+
+
+def _user_id(username: str) -> int:
+    return 1_000_000 + zlib.crc32(username.lower().encode('utf-8'))
+
+
+def _timestamp(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def _parse_time(value: str) -> float:
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+class _Window:
+    """Fixed rate-limit window of one endpoint, reported with the v2 x-rate-limit-* headers"""
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.reset = time.time() + window_seconds
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> Tuple[bool, Dict[str, str]]:
+        with self._lock:
+            now = time.time()
+            if now >= self.reset:
+                self.reset = now + self.window_seconds
+                self.used = 0
+            allowed = self.used < self.limit
+            self.used += allowed
+            headers = {
+                'x-rate-limit-limit': str(self.limit),
+                'x-rate-limit-remaining': str(self.limit - self.used),
+                # Rounded up, like the real API, so clients never wake before the window resets
+                'x-rate-limit-reset': str(int(self.reset) + 1),
+            }
+            return allowed, headers
+
+
+class MockTwitterAPI:
+    """
+    Synthetic Twitter API v2 data for any number of accounts.
+
+    Every username exists, with an ID derived from its name and a timeline
+    of tweets_per_user tweets whose newest was posted when the mock started.
+    Tweets are generated on request from their ID alone, so memory use does
+    not grow with the number of accounts or requests.
+    """
+
+    def __init__(self, tweets_per_user: int = config.MOCK_API_TWEETS_PER_USER,
+                 latency_ms: float = config.MOCK_API_LATENCY_MS,
+                 window_seconds: float = config.MOCK_API_WINDOW_SECONDS,
+                 rate_limits: Optional[Dict[str, int]] = None):
+        self.tweets_per_user = tweets_per_user
+        self.latency_ms = latency_ms
+        self.started_at = int(time.time())
+        self.windows = {endpoint: _Window(limit, window_seconds)
+                        for endpoint, limit in (rate_limits or RATE_LIMITS).items()}
+        self.requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Seconds to wait before answering: log-normal around latency_ms, with a long tail"""
+        if self.latency_ms <= 0:
+            return 0.0
+        return random.lognormvariate(0, 0.5) * self.latency_ms / 1000
+
+    def user(self, username: str) -> Dict:
+        user_id = _user_id(username)
+        return {
+            'id': str(user_id),
+            'username': username,
+            'name': username,
+            'description': f"Synthetic account {username}",
+            'created_at': _timestamp(self.started_at - 3 * 365 * 86400),
+            'public_metrics': {'followers_count': user_id % 100_000, 'following_count': user_id % 1000,
+                               'tweet_count': self.tweets_per_user, 'listed_count': 0},
+        }
+
+    def tweet(self, tweet_id: int) -> Optional[Dict]:
+        user_id, position = divmod(tweet_id, _TWEET_ID_STRIDE)
+        if not 0 <= position < self.tweets_per_user:
+            return None
+        rng = random.Random(tweet_id)
+        words = rng.choices(WORDS, k=rng.randint(6, 30))
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), f"https://t.co/{rng.getrandbits(40):x}")
+        tags = rng.sample(HASHTAGS, rng.randint(0, 2))
+        text = ' '.join(words)
+        hashtags = []
+        for tag in tags:
+            hashtags.append({'start': len(text) + 1, 'end': len(text) + 2 + len(tag), 'tag': tag})
+            text += f" #{tag}"
+        domain = rng.choice(ANNOTATION_DOMAINS)
+        age = (self.tweets_per_user - 1 - position) * TWEET_INTERVAL_SECONDS
+        return {
+            'id': str(tweet_id),
+            'edit_history_tweet_ids': [str(tweet_id)],
+            'text': text,
+            'author_id': str(user_id),
+            'created_at': _timestamp(self.started_at - age),
+            'public_metrics': {'like_count': rng.randrange(500), 'retweet_count': rng.randrange(100),
+                               'reply_count': rng.randrange(50), 'quote_count': rng.randrange(10)},
+            'entities': {'hashtags': hashtags} if hashtags else {},
+            'context_annotations': [{'domain': {'id': str(ANNOTATION_DOMAINS.index(domain)), 'name': domain},
+                                     'entity': {'id': '0', 'name': domain}}],
+        }
+
+    def timeline(self, user_id: int, params: Dict[str, str]) -> Dict:
+        """One page of a user's timeline, newest first, honoring the v2 paging and filter parameters"""
+        max_results = min(max(int(params.get('max_results', 10)), 5), 100)
+        newest = self.tweets_per_user - 1
+        oldest = 0
+        if 'since_id' in params:
+            oldest = max(oldest, int(params['since_id']) - user_id * _TWEET_ID_STRIDE + 1)
+        if 'until_id' in params:
+            newest = min(newest, int(params['until_id']) - user_id * _TWEET_ID_STRIDE - 1)
+        if 'start_time' in params:
+            age = self.started_at - _parse_time(params['start_time'])
+            oldest = max(oldest, self.tweets_per_user - 1 - int(age // TWEET_INTERVAL_SECONDS))
+        if 'pagination_token' in params:
+            newest = min(newest, int(params['pagination_token']))
+
+        positions = range(newest, max(oldest, newest - max_results + 1) - 1, -1)
+        tweets = [self.tweet(user_id * _TWEET_ID_STRIDE + position) for position in positions]
+        meta = {'result_count': len(tweets)}
+        if tweets:
+            meta['newest_id'], meta['oldest_id'] = tweets[0]['id'], tweets[-1]['id']
+            if positions[-1] > oldest:
+                meta['next_token'] = str(positions[-1] - 1)
+        return {'data': tweets, 'meta': meta} if tweets else {'meta': meta}
+
+    def handle(self, path: str, params: Dict[str, str]) -> Tuple[int, Dict, Dict[str, str]]:
+        """
+        Answer a GET request
+
+        Returns:
+            Tuple of (HTTP status, JSON body, extra headers)
+        """
+        with self._lock:
+            self.requests += 1
+        endpoint = endpoint_key('GET', path)
+        window = self.windows.get(endpoint)
+        if window is None:
+            return 404, {'title': 'Not Found Error', 'detail': f"Unsupported endpoint {endpoint}"}, {}
+        allowed, headers = window.take()
+        if not allowed:
+            with self._lock:
+                self.rate_limited += 1
+            return 429, {'title': 'Too Many Requests', 'detail': 'Too Many Requests', 'status': 429}, headers
+
+        parts = path.strip('/').split('/')
+        if endpoint == 'GET /2/users/by':
+            usernames = [name for name in params.get('usernames', '').split(',') if name]
+            return 200, {'data': [self.user(name) for name in usernames]}, headers
+        if endpoint == 'GET /2/users/by/username/:username':
+            return 200, {'data': self.user(parts[-1])}, headers
+        if endpoint == 'GET /2/users/:id/tweets':
+            return 200, self.timeline(int(parts[2]), params), headers
+        tweets = [self.tweet(int(tweet_id)) for tweet_id in params.get('ids', '').split(',') if tweet_id]
+        return 200, {'data': [tweet for tweet in tweets if tweet is not None]}, headers
+
+
+def make_handler(api: MockTwitterAPI):
+    class MockTwitterHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            time.sleep(api.delay())
+            status, body, headers = api.handle(url.path, params)
+
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # Thousands of requests per second would drown the console
+            pass
+
+    return MockTwitterHandler
+
+
+def start(host: str = config.MOCK_API_HOST, port: int = config.MOCK_API_PORT,
+          api: Optional[MockTwitterAPI] = None) -> ThreadingHTTPServer:
+    """Serve the mock API from a background thread; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), make_handler(api or MockTwitterAPI()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='mock-twitter-api', daemon=True).start()
+    return server
+
+
+def load_test(accounts: int, tweets_per_account: int, base_url: str) -> Dict:
+    """
+    Collect from many synthetic accounts through the regular rate-limited client
+
+    Args:
+        accounts: Number of accounts to collect
+        tweets_per_account: Tweets requested per account
+        base_url: Where the mock API is served
+
+    Returns:
+        Dictionary with the tweets collected, elapsed seconds and rate-limit wait
+    """
+    from data_collection import stream_tweets
+    from rate_limit import RateLimitedClient
+
+    client = RateLimitedClient(bearer_token='mock', base_url=base_url)
+    usernames = [f"account{i}" for i in range(accounts)]
+    start_time = time.perf_counter()
+    collected = sum(len(chunk) for chunk in stream_tweets(usernames, max_tweets=tweets_per_account, client=client))
+    elapsed = time.perf_counter() - start_time
+    return {'tweets': collected, 'seconds': elapsed, 'tweets_per_second': collected / elapsed,
+            'rate_limit_wait_seconds': client.limiter.total_wait()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve a local stand-in for the Twitter API v2 endpoints used by collection. "
+                    "Point the collector at it with TWITTER_API_BASE_URL=http://HOST:PORT."
+    )
+    parser.add_argument('--host', default=config.MOCK_API_HOST)
+    parser.add_argument('--port', type=int, default=config.MOCK_API_PORT)
+    parser.add_argument('--tweets-per-user', type=int, default=config.MOCK_API_TWEETS_PER_USER)
+    parser.add_argument('--latency-ms', type=float, default=config.MOCK_API_LATENCY_MS,
+                        help="Median response latency")
+    parser.add_argument('--window', type=float, default=config.MOCK_API_WINDOW_SECONDS,
+                        help="Rate-limit window in seconds; shorten it to compress a long run")
+    parser.add_argument('--load-test', type=int, metavar='ACCOUNTS', default=0,
+                        help="Instead of serving, collect from this many accounts and report throughput")
+    parser.add_argument('--tweets-per-account', type=int, default=100,
+                        help="Tweets collected per account in a load test")
+    args = parser.parse_args()
+
+    api = MockTwitterAPI(args.tweets_per_user, args.latency_ms, args.window)
+    if args.load_test:
+        server = start(args.host, 0, api)
+        base_url = f"http://{args.host}:{server.server_address[1]}"
+        try:
+            result = load_test(args.load_test, args.tweets_per_account, base_url)
+        finally:
+            server.shutdown()
+        print(f"Collected {result['tweets']} tweets from {args.load_test} accounts in {result['seconds']:.1f}s "
+              f"({result['tweets_per_second']:.0f} tweets/s, {api.requests} requests, "
+              f"{api.rate_limited} rate limited, {result['rate_limit_wait_seconds']:.1f}s waiting on limits)")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(api))
+        server.daemon_threads = True
+        print(f"Serving mock Twitter API on http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nShutting down mock Twitter API...")
+        finally:
+            server.server_close()
@@ -1,56 +1,79 @@
 # src/model.py
-import torch
-from transformers import GPT2LMHeadModel, GPT2Tokenizer, TextDataset, DataCollatorForLanguageModeling
-from transformers import Trainer, TrainingArguments
+import config
+import metrics
+import model_registry
 
 class TweetGenerator:
-    def __init__(self, model_name=config.MODEL_NAME):
-        self.tokenizer = GPT2Tokenizer.from_pretrained(model_name)
-        self.model = GPT2LMHeadModel.from_pretrained(model_name)
-        
-        # Add padding token
-        self.tokenizer.pad_token = self.tokenizer.eos_token
-        
-    def prepare_data(self, texts):
-        # Tokenize texts
-        encodings = self.tokenizer(texts, truncation=True, padding=True)
-        
-        # Create dataset
-        dataset = TextDataset(
-            tokenizer=self.tokenizer,
-            file_path=texts,
-            block_size=128
-        )
-        
-        return dataset
-        
+    def __init__(self, model_name=config.MODEL_NAME, backend=config.INFERENCE_BACKEND):
+        # Weights are loaded from the shared registry on first use
+        self.model_name = model_name
+        self.backend = backend
+
+    @property
+    def model(self):
+        return model_registry.get_model(self.model_name, self.backend)[0]
+
+    @property
+    def tokenizer(self):
+        return model_registry.get_model(self.model_name, self.backend)[1]
+
+    def prepare_data(self, texts, block_size=config.BLOCK_SIZE):
+        from training_data import PackedTweetDataset
+
+        # Tokenized once per corpus, cached on disk and packed into blocks
+        return PackedTweetDataset(texts, self.tokenizer, block_size=block_size)
+
     def train(self, dataset):
+        from transformers import Trainer, TrainingArguments
+
+        from training_data import PackedBlockCollator
+
+        if self.backend != 'torch':
+            raise ValueError(f"Fine-tuning needs the torch backend, not {self.backend!r}; "
+                             f"convert the trained checkpoint with convert_model.py afterwards")
+
         training_args = TrainingArguments(
             output_dir="./results",
             num_train_epochs=config.EPOCHS,
             per_device_train_batch_size=config.BATCH_SIZE,
             save_steps=500,
             save_total_limit=2,
+            # Batch blocks of similar length so dynamic padding stays small
+            group_by_length=True,
         )
-        
-        data_collator = DataCollatorForLanguageModeling(
-            tokenizer=self.tokenizer, mlm=False
-        )
-        
+
+        # Not DataCollatorForLanguageModeling: it masks every pad-ID label, which here includes
+        # the EOS separators, and pads on the tokenizer's (left) side, shifting block positions
+        data_collator = PackedBlockCollator(self.tokenizer.pad_token_id)
+
         trainer = Trainer(
             model=self.model,
             args=training_args,
             data_collator=data_collator,
             train_dataset=dataset,
         )
-        
-        trainer.train()
-        
-    def generate_tweet(self, prompt="", max_length=config.MAX_LENGTH):
-        inputs = self.tokenizer(prompt, return_tensors="pt")
-        
-        outputs = self.model.generate(
-            **inputs,
+
+        with metrics.timer('tweetgen_function_seconds', function='train'):
+            result = trainer.train()
+        metrics.inc('tweetgen_training_steps_total', result.global_step)
+        # Cached prompt key/values were computed with the old weights
+        model_registry.clear_prefix_cache(self.model_name, self.backend)
+
+    def save(self, path):
+        """Write the model and tokenizer as a checkpoint that TweetGenerator(path) can load"""
+        self.model.save_pretrained(path)
+        self.tokenizer.save_pretrained(path)
+
+    def _prompt_inputs(self, prompt):
+        # Start from the BOS token so an empty prompt still gives the model an input
+        prompt = self.tokenizer.bos_token + prompt
+        prefix_cache = model_registry.get_prefix_cache(self.model_name, self.backend)
+        if prefix_cache is not None:
+            return prefix_cache.build_inputs(prompt, [''])
+        return self.tokenizer(prompt, return_tensors="pt")
+
+    def _sampling_kwargs(self, max_length):
+        return dict(
             max_length=max_length,
             num_return_sequences=1,
             no_repeat_ngram_size=2,
@@ -59,5 +82,25 @@ class TweetGenerator:
             top_p=0.95,
             temperature=0.7,
         )
-        
-        return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
\ No newline at end of file
+
+    @metrics.profiled('generate_tweet')
+    def generate_tweet(self, prompt="", max_length=config.MAX_LENGTH):
+        inputs = self._prompt_inputs(prompt)
+        outputs = self.model.generate(**inputs, **self._sampling_kwargs(max_length))
+        metrics.inc('tweetgen_tokens_generated_total', outputs.shape[1] - inputs['input_ids'].shape[1])
+
+        return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+    def stream_tweet(self, prompt="", max_length=config.MAX_LENGTH):
+        """Yield the continuation of prompt in cleaned pieces as tokens are decoded"""
+        from streaming import clean_stream, stream_generate
+
+        inputs = self._prompt_inputs(prompt)
+        yield from clean_stream(stream_generate(self.model, self.tokenizer, inputs,
+                                                **self._sampling_kwargs(max_length)))
+
+    async def astream_tweet(self, prompt="", max_length=config.MAX_LENGTH):
+        from streaming import astream
+
+        async for piece in astream(self.stream_tweet(prompt, max_length)):
+            yield piece
@@ -0,0 +1,101 @@
+# src/model_registry.py
+import threading
+import time
+from typing import Dict, Tuple
+
+import backends
+import config
+import metrics
+
+# transformers/torch are imported on first use so collection-only runs never pay for them
+_models: Dict[Tuple[str, str], Tuple] = {}
+_pipelines: Dict[Tuple[str, str], object] = {}
+_prefix_caches: Dict[Tuple[str, str], object] = {}
+_lock = threading.RLock()
+
+
+def get_model(model_name: str = config.MODEL_NAME, backend: str = config.INFERENCE_BACKEND) -> Tuple:
+    """
+    Return the process-wide (model, tokenizer) pair for model_name, loading it on first use
+
+    Args:
+        model_name: Hugging Face model name or local checkpoint path
+        backend: Inference backend, one of 'torch', 'quantized', 'onnx' or 'shared'
+
+    Returns:
+        Tuple of (model, GPT2Tokenizer)
+    """
+    key = (model_name, backend)
+    with _lock:
+        if key not in _models:
+            from transformers import GPT2Tokenizer
+
+            print(f"Loading model {model_name} ({backend})...")
+            start = time.perf_counter()
+            tokenizer = GPT2Tokenizer.from_pretrained(model_name)
+            model = backends.load_model(model_name, backend)
+
+            # GPT-2 has no pad token; pad on the left so batched prompts decode correctly
+            tokenizer.pad_token = tokenizer.eos_token
+            tokenizer.padding_side = 'left'
+            model.config.pad_token_id = tokenizer.eos_token_id
+            _models[key] = (model, tokenizer)
+            metrics.observe('tweetgen_model_load_seconds', time.perf_counter() - start,
+                            model=model_name, backend=backend)
+        return _models[key]
+
+
+def get_pipeline(model_name: str = config.MODEL_NAME, backend: str = config.INFERENCE_BACKEND):
+    """
+    Return a text-generation pipeline sharing the registry's model instance
+
+    Args:
+        model_name: Hugging Face model name or local checkpoint path
+        backend: Inference backend, one of 'torch', 'quantized', 'onnx' or 'shared'
+
+    Returns:
+        transformers text-generation pipeline
+    """
+    key = (model_name, backend)
+    with _lock:
+        if key not in _pipelines:
+            from transformers import pipeline
+
+            model, tokenizer = get_model(model_name, backend)
+            _pipelines[key] = pipeline('text-generation', model=model, tokenizer=tokenizer)
+        return _pipelines[key]
+
+
+def get_prefix_cache(model_name: str = config.MODEL_NAME, backend: str = config.INFERENCE_BACKEND):
+    """
+    Return the shared prompt-prefix key/value cache for a model, or None where it does not apply
+
+    ONNX Runtime models manage their own past key/values, so they are served without one.
+    """
+    if not config.USE_PREFIX_CACHE or backend == 'onnx':
+        return None
+    key = (model_name, backend)
+    with _lock:
+        if key not in _prefix_caches:
+            from prefix_cache import PrefixCache
+
+            model, tokenizer = get_model(model_name, backend)
+            _prefix_caches[key] = PrefixCache(model, tokenizer)
+        return _prefix_caches[key]
+
+
+def clear_prefix_cache(model_name: str = config.MODEL_NAME, backend: str = config.INFERENCE_BACKEND) -> None:
+    """Drop a model's cached prefixes, e.g. after its weights were fine-tuned in place"""
+    with _lock:
+        _prefix_caches.pop((model_name, backend), None)
+
+
+def is_loaded(model_name: str = config.MODEL_NAME, backend: str = config.INFERENCE_BACKEND) -> bool:
+    with _lock:
+        return (model_name, backend) in _models
+
+
+def warm(model_name: str = config.MODEL_NAME, backend: str = config.INFERENCE_BACKEND) -> None:
+    """Load the model ahead of the first generation call"""
+    get_model(model_name, backend)
+    print(f"Model {model_name} ({backend}) is loaded")
@@ -0,0 +1,194 @@
+# src/near_duplicates.py
+import os
+import re
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import config
+
+_SUB_BATCH = 1024  # Texts hashed together; bounds the (shingles x permutations) matrix
+
+
+def normalize(text: str) -> str:
+    """Lowercase a tweet and reduce it to words separated by single spaces"""
+    text = re.sub(r'[^\w\s]', ' ', str(text).lower())
+    return ' '.join(text.split())
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures of tweet texts with an LSH table for sub-linear lookups.
+
+    Texts are shingled into overlapping byte n-grams and hashed with
+    num_perm permutations; similarity is the share of equal signature slots,
+    an estimate of Jaccard similarity. Signatures are split into bands and
+    each band is kept as a sorted hash array, so a lookup is a binary search
+    per band and only texts that share a whole band are compared.
+    """
+
+    def __init__(self, num_perm: int = config.DEDUPE_NUM_PERM, bands: int = config.DEDUPE_BANDS,
+                 threshold: float = config.DEDUPE_THRESHOLD, shingle_size: int = config.DEDUPE_SHINGLE_SIZE,
+                 seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        # Permutations x -> a * x + b (mod 2^32) of the already well-mixed 32-bit shingle hashes
+        self._a = rng.integers(0, 1 << 32, (num_perm, 1), dtype=np.uint32) | np.uint32(1)
+        self._b = rng.integers(0, 1 << 32, (num_perm, 1), dtype=np.uint32)
+        self._powers = rng.integers(1, 1 << 63, shingle_size, dtype=np.uint64) | np.uint64(1)
+        self._band_weights = rng.integers(1, 1 << 63, num_perm // bands, dtype=np.uint64) | np.uint64(1)
+
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._band_hashes = None  # Sorted (bands, n) arrays, rebuilt lazily after adds
+        self._band_positions = None
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signatures(self, texts: Iterable[str]) -> np.ndarray:
+        """
+        MinHash signatures of texts
+
+        Returns:
+            uint32 array of shape (len(texts), num_perm)
+        """
+        texts = [normalize(text).encode('utf-8') for text in texts]
+        parts = [self._signature_batch(texts[start:start + _SUB_BATCH])
+                 for start in range(0, len(texts), _SUB_BATCH)]
+        return np.concatenate(parts) if parts else np.empty((0, self.num_perm), dtype=np.uint32)
+
+    def _signature_batch(self, texts: List[bytes]) -> np.ndarray:
+        k = self.shingle_size
+        # Short texts are padded so every text has at least one shingle
+        texts = [text.ljust(k) for text in texts]
+        data = np.frombuffer(b''.join(texts), dtype=np.uint8).astype(np.uint64)
+        lengths = np.array([len(text) for text in texts])
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+        # Shingle hashes for every byte offset, keeping only shingles inside one text
+        windows = np.lib.stride_tricks.sliding_window_view(data, k)
+        shingles = windows @ self._powers
+        shingles ^= shingles >> np.uint64(29)
+        counts = lengths - k + 1
+        valid = np.concatenate([np.arange(start, start + count) for start, count in zip(starts, counts)])
+        shingles = (shingles[valid] >> np.uint64(32)).astype(np.uint32)
+
+        # (num_perm, shingles) keeps each text's shingles contiguous for the reduction
+        permuted = self._a * shingles + self._b
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        return np.ascontiguousarray(np.minimum.reduceat(permuted, offsets, axis=1).T)
+
+    def _bands_of(self, signatures: np.ndarray) -> np.ndarray:
+        rows = signatures.reshape(len(signatures), self.bands, -1).astype(np.uint64)
+        return (rows * self._band_weights).sum(axis=2)
+
+    def _tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._band_hashes is None:
+            hashes = self._bands_of(self._signatures).T
+            order = np.argsort(hashes, axis=1, kind='stable')
+            self._band_hashes = np.take_along_axis(hashes, order, axis=1)
+            self._band_positions = order
+        return self._band_hashes, self._band_positions
+
+    def add_signatures(self, signatures: np.ndarray) -> None:
+        self._signatures = np.concatenate([self._signatures, signatures.astype(np.uint32)])
+        self._band_hashes = self._band_positions = None
+
+    def add(self, texts: Iterable[str]) -> None:
+        self.add_signatures(self.signatures(texts))
+
+    def query_signature(self, signature: np.ndarray) -> List[Tuple[int, float]]:
+        """Positions and estimated similarities of indexed texts at or above the threshold"""
+        if not len(self):
+            return []
+        hashes, positions = self._tables()
+        band_hashes = self._bands_of(signature[None, :])[0]
+        candidates = set()
+        for band, value in enumerate(band_hashes):
+            left = np.searchsorted(hashes[band], value, side='left')
+            right = np.searchsorted(hashes[band], value, side='right')
+            candidates.update(positions[band, left:right].tolist())
+        if not candidates:
+            return []
+
+        candidates = np.fromiter(candidates, dtype=np.int64)
+        similarity = (self._signatures[candidates] == signature).mean(axis=1)
+        keep = similarity >= self.threshold
+        return sorted(zip(candidates[keep].tolist(), similarity[keep].tolist()), key=lambda x: -x[1])
+
+    def query(self, text: str) -> List[Tuple[int, float]]:
+        return self.query_signature(self.signatures([text])[0])
+
+    def is_duplicate(self, text: str) -> bool:
+        return bool(self.query(text))
+
+    def unique_mask(self, signatures: np.ndarray) -> np.ndarray:
+        """
+        Mark texts that have no near-duplicate in the index or earlier in the same array
+
+        Within the array, texts sharing an LSH band are compared with the
+        earliest text in that band, so the first copy of each group survives.
+
+        Args:
+            signatures: Signatures from signatures(), in priority order
+
+        Returns:
+            Boolean mask of the texts to keep
+        """
+        keep = np.ones(len(signatures), dtype=bool)
+        if not len(signatures):
+            return keep
+        if len(self):
+            keep = np.array([not self.query_signature(signature) for signature in signatures])
+
+        positions = np.arange(len(signatures))
+        for band_hashes in self._bands_of(signatures).T:
+            order = np.lexsort((positions, band_hashes))
+            sorted_hashes = band_hashes[order]
+            group_start = np.r_[True, sorted_hashes[1:] != sorted_hashes[:-1]]
+            first = order[np.maximum.accumulate(np.where(group_start, np.arange(len(order)), 0))]
+            later = order[~group_start]
+            similarity = (signatures[later] == signatures[first[~group_start]]).mean(axis=1)
+            keep[later[similarity >= self.threshold]] = False
+        return keep
+
+    def save(self, path: str) -> None:
+        """Write the signatures and hashing parameters to an .npz file"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.tmp.npz"
+        np.savez(temp_path, signatures=self._signatures,
+                 params=np.array([self.num_perm, self.bands, self.shingle_size, self.seed]))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, threshold: float = config.DEDUPE_THRESHOLD) -> 'NearDuplicateIndex':
+        with np.load(path) as data:
+            num_perm, bands, shingle_size, seed = data['params'].tolist()
+            index = cls(num_perm, bands, threshold, shingle_size, seed)
+            index.add_signatures(data['signatures'])
+        return index
+
+    @classmethod
+    def open(cls, path: str, threshold: float = config.DEDUPE_THRESHOLD) -> 'NearDuplicateIndex':
+        """Load the index at path, or start an empty one if it was never saved"""
+        return cls.load(path, threshold) if os.path.exists(path) else cls(threshold=threshold)
+
+
+def dedupe_texts(texts: Iterable[str], index: Optional[NearDuplicateIndex] = None) -> np.ndarray:
+    """
+    Keep-mask dropping texts that nearly repeat an earlier text (or one already in index)
+
+    Kept texts are added to the index.
+    """
+    index = index if index is not None else NearDuplicateIndex()
+    signatures = index.signatures(texts)
+    keep = index.unique_mask(signatures)
+    index.add_signatures(signatures[keep])
+    return keep
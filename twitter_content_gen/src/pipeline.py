@@ -0,0 +1,169 @@
+# src/pipeline.py
+import hashlib
+import json
+import os
+import pickle
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import config
+import metrics
+
+
+def hash_files(path: str) -> str:
+    """Content hash of a file, or of every file below a directory"""
+    digest = hashlib.sha256()
+    paths = [path] if os.path.isfile(path) else sorted(
+        os.path.join(root, name) for root, _, files in os.walk(path) for name in files
+    )
+    for file_path in paths:
+        digest.update(os.path.relpath(file_path, path).encode('utf-8') + b'\0')
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_value(value: Any) -> str:
+    return hashlib.sha256(pickle.dumps(value)).hexdigest()
+
+
+class Stage:
+    """
+    One step of a pipeline.
+
+    run(inputs, workdir) receives the outputs of the stages named in inputs
+    and a directory for its artifacts, and returns a picklable output. The
+    output's fingerprint (fingerprint(output), by default a hash of the
+    pickled output) is what downstream stages are keyed on, so a stage that
+    reruns but produces the same content does not invalidate its dependents.
+    """
+
+    def __init__(self, name: str, run: Callable[[Dict[str, Any], str], Any], inputs: Iterable[str] = (),
+                 params: Optional[Dict] = None, fingerprint: Callable[[Any], str] = hash_value,
+                 always_run: bool = False):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.params = params or {}
+        self.fingerprint = fingerprint
+        # For stages that observe the outside world (e.g. collection) or are wanted every time
+        self.always_run = always_run
+
+    def key(self, fingerprints: Dict[str, str]) -> str:
+        payload = {'stage': self.name, 'params': self.params,
+                   'inputs': {name: fingerprints[name] for name in self.inputs}}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class Pipeline:
+    """
+    Runs stages in order, skipping those whose inputs and parameters are unchanged.
+
+    Each completed stage is recorded in a manifest under root with the key
+    it ran with and its output fingerprint, and its output is stored next to
+    it. A run that crashes leaves the manifest at the last completed stage,
+    so the next run resumes at the stage that failed.
+    """
+
+    def __init__(self, stages: List[Stage], root: str = config.PIPELINE_DIR):
+        self.stages = stages
+        self.root = root
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        names = [stage.name for stage in stages]
+        for stage in stages:
+            unknown = [name for name in stage.inputs if name not in names[:names.index(stage.name)]]
+            if unknown:
+                raise ValueError(f"Stage {stage.name!r} depends on {unknown}, which do not run before it")
+
+    def _load_manifest(self) -> Dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: Dict) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def _output_path(self, stage: Stage) -> str:
+        return os.path.join(self.root, stage.name, 'output.pkl')
+
+    def _load_output(self, stage: Stage) -> Any:
+        with open(self._output_path(stage), 'rb') as f:
+            return pickle.load(f)
+
+    def status(self) -> Dict[str, Dict]:
+        """Manifest entry of every stage that has completed at least once"""
+        manifest = self._load_manifest()
+        return {stage.name: manifest[stage.name] for stage in self.stages if stage.name in manifest}
+
+    def run(self, only: Optional[Iterable[str]] = None, force: Iterable[str] = ()) -> Dict[str, Any]:
+        """
+        Run the pipeline
+
+        Args:
+            only: Names of the stages to consider; other stages are not run and
+                their last recorded outputs are used instead
+            force: Names of stages to rerun even if their inputs are unchanged
+
+        Returns:
+            Dictionary of stage name to output, for every stage with an output
+        """
+        names = [stage.name for stage in self.stages]
+        selected = set(only) if only is not None else set(names)
+        force = set(force)
+        unknown = (selected | force) - set(names)
+        if unknown:
+            raise ValueError(f"Unknown stages {sorted(unknown)}; expected some of {names}")
+
+        manifest = self._load_manifest()
+        outputs, fingerprints = {}, {}
+        for stage in self.stages:
+            record = manifest.get(stage.name)
+            output_exists = record is not None and os.path.exists(self._output_path(stage))
+
+            if stage.name not in selected:
+                if output_exists:
+                    fingerprints[stage.name] = record['fingerprint']
+                    outputs[stage.name] = self._load_output(stage)
+                continue
+
+            missing = [name for name in stage.inputs if name not in fingerprints]
+            if missing:
+                raise RuntimeError(f"Stage {stage.name!r} needs {missing}, which have never completed; "
+                                   f"run them first")
+
+            key = stage.key(fingerprints)
+            if (output_exists and record['key'] == key and not stage.always_run
+                    and stage.name not in force):
+                print(f"[{stage.name}] up to date, skipping")
+                metrics.inc('tweetgen_stages_skipped_total', stage=stage.name)
+                fingerprints[stage.name] = record['fingerprint']
+                outputs[stage.name] = self._load_output(stage)
+                continue
+
+            print(f"[{stage.name}] running")
+            start = time.perf_counter()
+            workdir = os.path.join(self.root, stage.name)
+            os.makedirs(workdir, exist_ok=True)
+            with metrics.timer('tweetgen_stage_seconds', stage=stage.name):
+                output = stage.run({name: outputs[name] for name in stage.inputs}, workdir)
+
+            with open(self._output_path(stage), 'wb') as f:
+                pickle.dump(output, f)
+            fingerprints[stage.name] = stage.fingerprint(output)
+            outputs[stage.name] = output
+            manifest[stage.name] = {
+                'key': key,
+                'fingerprint': fingerprints[stage.name],
+                'seconds': round(time.perf_counter() - start, 3),
+                'completed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            # Saved after every stage, so a crash later on resumes from here
+            self._save_manifest(manifest)
+            print(f"[{stage.name}] done in {manifest[stage.name]['seconds']:.1f}s")
+        return outputs
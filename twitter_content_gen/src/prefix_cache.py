@@ -0,0 +1,92 @@
+# src/prefix_cache.py
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import torch
+from transformers import DynamicCache
+
+import config
+
+
+class PrefixCache:
+    """
+    LRU cache of attention key/values for prompt prefixes shared across calls.
+
+    The key/values of a prefix are computed once per model and expanded over
+    every batch item that starts with it, so generation only runs the model
+    over the per-prompt suffix. The last prefix token is left uncached, which
+    keeps at least one fresh input token even when the suffix is empty.
+    """
+
+    def __init__(self, model, tokenizer, max_entries: int = config.PREFIX_CACHE_SIZE):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[List[int], tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, prefix: str) -> Tuple[List[int], tuple]:
+        """Return the prefix token IDs and the key/values of all but its last token"""
+        with self._lock:
+            if prefix in self._entries:
+                self._entries.move_to_end(prefix)
+                self.hits += 1
+                return self._entries[prefix]
+
+            self.misses += 1
+            prefix_ids = self.tokenizer(prefix)['input_ids']
+            if len(prefix_ids) > 1:
+                with torch.no_grad():
+                    output = self.model(torch.tensor([prefix_ids[:-1]]), use_cache=True)
+                past = output.past_key_values
+                past = past.to_legacy_cache() if hasattr(past, 'to_legacy_cache') else past
+            else:
+                past = ()
+
+            self._entries[prefix] = (prefix_ids, past)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return self._entries[prefix]
+
+    def build_inputs(self, prefix: str, suffixes: List[str]) -> Dict:
+        """
+        Build generate() inputs for prompts made of a shared prefix and per-prompt suffixes
+
+        Pads go between the cached part of the prefix and the uncached last
+        prefix token, so the cached prefix stays aligned across the batch and
+        every row, including one with an empty suffix, ends in a real token;
+        the attention mask hides the pads.
+
+        Args:
+            prefix: Text shared by every prompt
+            suffixes: Remaining text of each prompt
+
+        Returns:
+            Dictionary of input_ids, attention_mask and past_key_values
+        """
+        prefix_ids, past = self.get(prefix)
+        suffix_ids = [self.tokenizer(suffix)['input_ids'] if suffix else [] for suffix in suffixes]
+        longest = max(len(ids) for ids in suffix_ids)
+        pad_id = self.tokenizer.pad_token_id
+
+        input_ids, attention_mask = [], []
+        for ids in suffix_ids:
+            padding = longest - len(ids)
+            input_ids.append(prefix_ids[:-1] + [pad_id] * padding + prefix_ids[-1:] + ids)
+            attention_mask.append([1] * (len(prefix_ids) - 1) + [0] * padding + [1] * (len(ids) + 1))
+
+        inputs = {
+            'input_ids': torch.tensor(input_ids),
+            'attention_mask': torch.tensor(attention_mask),
+        }
+        if past:
+            batch_size = len(suffixes)
+            # Generation appends to new tensors, so expanded views leave the cached entry untouched
+            inputs['past_key_values'] = DynamicCache.from_legacy_cache(tuple(
+                (key.expand(batch_size, -1, -1, -1), value.expand(batch_size, -1, -1, -1))
+                for key, value in past
+            ))
+        return inputs
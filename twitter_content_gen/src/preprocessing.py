@@ -1,32 +1,156 @@
 # src/preprocessing.py
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import config
+import metrics
+from near_duplicates import NearDuplicateIndex, dedupe_texts
+from tweet_store import raw_store
+
+TRAINING_COLUMNS = ['id', 'username', 'text', 'engagement']
+
+# URLs go first, since a URL glued to a hashtag would otherwise be taken for part of it
+URL_PATTERN = re.compile(r'http\S+|www\S+')
+TAG_PATTERN = re.compile(r'[@#]\w+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# The same patterns for pyarrow's RE2 engine, whose \w and \s only match ASCII
+_SPACE = r'\t\n\x0b\x0c\r\x1c-\x1f \x85\p{Z}'
+ARROW_URL_PATTERN = rf'http[^{_SPACE}]+|www[^{_SPACE}]+'
+ARROW_TAG_PATTERN = r'[@#][\p{L}\p{N}_]+'
+ARROW_WHITESPACE_PATTERN = rf'[{_SPACE}]+'
+
 
 def clean_tweet(text):
-    # Remove URLs
-    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-    # Remove mentions
-    text = re.sub(r'@\w+', '', text)
-    # Remove hashtags
-    text = re.sub(r'#\w+', '', text)
-    # Remove multiple spaces
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
-
-def prepare_training_data(df):
-    # Clean tweets
-    df['cleaned_text'] = df['text'].apply(clean_tweet)
-    
-    # Remove empty tweets
-    df = df[df['cleaned_text'].str.len() > 0]
-    
-    # Sort by engagement (likes + retweets)
-    df['engagement'] = df['likes'] + df['retweets']
-    df = df.sort_values('engagement', ascending=False)
-    
+    text = URL_PATTERN.sub('', text)
+    text = TAG_PATTERN.sub('', text)
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def clean_texts(texts: pd.Series) -> pd.Series:
+    """clean_tweet over a whole Series, run by pyarrow compute kernels outside the GIL"""
+    array = pa.array(texts, type=pa.string(), from_pandas=True)
+    array = pc.replace_substring_regex(array, ARROW_URL_PATTERN, '')
+    array = pc.replace_substring_regex(array, ARROW_TAG_PATTERN, '')
+    array = pc.replace_substring_regex(array, ARROW_WHITESPACE_PATTERN, ' ')
+    return pc.utf8_trim(array, ' ').to_pandas().set_axis(texts.index)
+
+
+def _clean_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    # Runs in worker processes; the raw text is dropped so only cleaned rows travel back
+    cleaned = clean_texts(df['text'])
+    keep = cleaned.str.len() > 0
+    return df.loc[keep].drop(columns='text').assign(cleaned_text=cleaned[keep])
+
+
+def _chunks(df: pd.DataFrame, chunk_size: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def clean_chunks(chunks: Iterable[pd.DataFrame], workers: int = config.PREPROCESS_WORKERS) -> Iterator[pd.DataFrame]:
+    """
+    Clean a stream of tweet DataFrames across a process pool
+
+    At most two chunks per worker are in flight, so memory stays bounded
+    however long the input stream is. Results keep the input order.
+
+    Args:
+        chunks: DataFrames with a 'text' column
+        workers: Worker processes; 1 cleans in this process
+
+    Yields:
+        Each chunk without its 'text' column, with a non-empty 'cleaned_text' column
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield _clean_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_clean_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+@metrics.timed('tweetgen_function_seconds', function='prepare_training_data')
+def prepare_training_data(df, workers: int = config.PREPROCESS_WORKERS,
+                          chunk_size: int = config.PREPROCESS_CHUNK_SIZE, dedupe: bool = True):
+    # Small corpora are not worth the cost of starting worker processes
+    workers = workers if len(df) > chunk_size else 1
+    parts = list(clean_chunks(_chunks(df, chunk_size), workers))
+    metrics.inc('tweetgen_rows_preprocessed_total', sum(len(part) for part in parts))
+    df = pd.concat(parts) if parts else df.assign(cleaned_text=pd.Series(dtype=str))
+    return _finish(df, NearDuplicateIndex() if dedupe else None)
+
+
+def drop_near_duplicates(df: pd.DataFrame, index: Optional[NearDuplicateIndex] = None) -> pd.DataFrame:
+    """
+    Drop tweets whose cleaned text nearly repeats an earlier row
+
+    Rows are kept in order of priority, so sort before calling. Kept texts
+    are added to index, which then describes the deduplicated corpus.
+    """
+    keep = dedupe_texts(df['cleaned_text'], index)
+    if not keep.all():
+        print(f"Dropped {int((~keep).sum())} near-duplicate tweets")
+    return df[keep].reset_index(drop=True)
+
+
+def _finish(df: pd.DataFrame, index: Optional[NearDuplicateIndex] = None) -> pd.DataFrame:
+    # Engagement is stored at collection time; only frames without it compute it here
+    if 'engagement' not in df.columns:
+        df = df.assign(engagement=df['likes'] + df['retweets'])
+    df = df.sort_values('engagement', ascending=False, kind='stable').reset_index(drop=True)
+    # The most engaging copy of each near-duplicate group is the one kept
+    return drop_near_duplicates(df, index) if index is not None else df
+
+
+@metrics.timed('tweetgen_function_seconds', function='load_training_data')
+def load_training_data(store=None, usernames=None, workers: int = config.PREPROCESS_WORKERS,
+                       chunk_size: int = config.PREPROCESS_CHUNK_SIZE, dedupe: bool = True,
+                       index_path: Optional[str] = config.CORPUS_INDEX_PATH):
+    """
+    Stream the training columns from the raw store and clean them in parallel
+
+    Raw text is only ever held one batch per worker; the result keeps the
+    cleaned text of the most recently ingested copy of each tweet. With
+    dedupe, near-duplicate tweets are dropped and the similarity index of
+    the remaining corpus is saved to index_path for generation to check against.
+    """
+    store = store or raw_store()
+    batches = store.iter_batches(columns=TRAINING_COLUMNS + ['ingested_at'], batch_size=chunk_size,
+                                 usernames=usernames)
+    parts = list(clean_chunks(batches, workers))
+    metrics.inc('tweetgen_rows_preprocessed_total', sum(len(part) for part in parts))
+    if not parts:
+        return pd.DataFrame(columns=['id', 'username', 'engagement', 'cleaned_text'])
+
+    df = pd.concat(parts, ignore_index=True)
+    df = (df.sort_values('ingested_at', kind='stable')
+          .drop_duplicates(subset='id', keep='last')
+          .drop(columns='ingested_at'))
+    index = NearDuplicateIndex() if dedupe else None
+    df = _finish(df, index)
+    if index is not None and index_path:
+        index.save(index_path)
     return df
 
-def create_training_sets(df):
-    texts = df['cleaned_text'].tolist()
-    return train_test_split(texts, test_size=0.2, random_state=42)
\ No newline at end of file
+
+def create_training_sets(df, test_size: float = 0.2, random_state: Optional[int] = 42) -> Tuple[np.ndarray, np.ndarray]:
+    # Shuffled positions split one array of texts, instead of copying it into Python lists
+    texts = df['cleaned_text'].to_numpy()
+    order = np.random.default_rng(random_state).permutation(len(texts))
+    n_test = int(np.ceil(len(texts) * test_size))
+    return texts[order[n_test:]], texts[order[:n_test]]
@@ -0,0 +1,209 @@
+# src/rate_limit.py
+import re
+import threading
+import time
+from typing import Callable, Dict, Mapping, Optional
+
+import requests
+import tweepy
+from requests.adapters import HTTPAdapter
+
+import config
+import metrics
+
+# Host tweepy sends every v2 request to
+TWITTER_API_HOST = 'https://api.twitter.com'
+
+# Twitter rate limits are per endpoint template, so ids and usernames in the route are folded away
+ROUTE_ID_PATTERN = re.compile(r'(?<=.)/\d+(?=/|$)')
+ROUTE_USERNAME_PATTERN = re.compile(r'/by/username/[^/]+')
+
+
+def endpoint_key(method: str, route: str) -> str:
+    route = ROUTE_USERNAME_PATTERN.sub('/by/username/:username', route)
+    route = ROUTE_ID_PATTERN.sub('/:id', route)
+    return f"{method.upper()} {route}"
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket for a single API endpoint.
+
+    Starts from a configured budget and re-tunes itself from the
+    x-rate-limit-* headers of every response, spreading the remaining
+    quota evenly over the time left in the current window.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float,
+                 clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self.consecutive_429s = 0
+        self.total_wait = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Block until a request may be sent; returns the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.total_wait += waited
+                    return waited
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                else:
+                    delay = (1 - self.tokens) / self.refill_per_second
+            self._sleep(delay)
+            waited += delay
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        """Adopt the budget reported by a successful response"""
+        limit = _header_int(headers, 'x-rate-limit-limit')
+        remaining = _header_int(headers, 'x-rate-limit-remaining')
+        reset = _header_int(headers, 'x-rate-limit-reset')
+        with self._lock:
+            self.consecutive_429s = 0
+            if remaining is None or reset is None:
+                return
+            now = self._clock()
+            self._refill(now)
+            if limit is not None:
+                self.capacity = float(limit)
+            self.tokens = min(self.tokens, float(remaining))
+            window_left = max(reset - now, 1.0)
+            if remaining > 0:
+                self.refill_per_second = remaining / window_left
+            else:
+                self.blocked_until = max(self.blocked_until, float(reset))
+
+    def backoff(self, headers: Optional[Mapping[str, str]] = None) -> None:
+        """Stop sending after a 429 until the window resets, or back off exponentially"""
+        reset = _header_int(headers or {}, 'x-rate-limit-reset')
+        with self._lock:
+            now = self._clock()
+            self.consecutive_429s += 1
+            self.tokens = 0.0
+            self._updated = now
+            if reset is not None and reset > now:
+                self.blocked_until = float(reset)
+            else:
+                delay = min(config.RATE_LIMIT_BACKOFF_BASE * 2 ** (self.consecutive_429s - 1),
+                            config.RATE_LIMIT_BACKOFF_MAX)
+                self.blocked_until = now + delay
+
+
+class RateLimiter:
+    """Shared registry of per-endpoint token buckets"""
+
+    def __init__(self, capacity: float = config.RATE_LIMIT_DEFAULT_REQUESTS,
+                 window_seconds: float = config.RATE_LIMIT_WINDOW_SECONDS,
+                 clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, endpoint: str) -> TokenBucket:
+        with self._lock:
+            if endpoint not in self._buckets:
+                self._buckets[endpoint] = TokenBucket(
+                    self.capacity, self.capacity / self.window_seconds,
+                    clock=self._clock, sleep=self._sleep
+                )
+            return self._buckets[endpoint]
+
+    def total_wait(self) -> float:
+        with self._lock:
+            return sum(bucket.total_wait for bucket in self._buckets.values())
+
+
+class BaseURLSession(requests.Session):
+    """requests.Session sending requests for the Twitter API host to base_url instead"""
+
+    def __init__(self, base_url: str):
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith(TWITTER_API_HOST):
+            url = self.base_url + url[len(TWITTER_API_HOST):]
+        return super().request(method, url, *args, **kwargs)
+
+
+class RateLimitedClient(tweepy.Client):
+    """
+    tweepy.Client that routes every request through a RateLimiter and
+    retries 429 responses after the limiter's backoff.
+
+    With base_url set, requests go to that server instead of the real API,
+    e.g. the local stand-in in mock_twitter_api.py.
+    """
+
+    def __init__(self, *args, limiter: Optional[RateLimiter] = None,
+                 max_retries: int = config.RATE_LIMIT_MAX_RETRIES,
+                 pool_size: int = config.COLLECTION_WORKERS,
+                 base_url: Optional[str] = config.TWITTER_API_BASE_URL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        if base_url:
+            self.session = BaseURLSession(base_url)
+        # Let every collector thread keep its own connection alive
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, route, params=None, json=None, user_auth=False):
+        endpoint = endpoint_key(method, route)
+        bucket = self.limiter.bucket(endpoint)
+        for attempt in range(self.max_retries + 1):
+            waited = bucket.acquire()
+            if waited:
+                metrics.inc('tweetgen_rate_limit_wait_seconds_total', waited, endpoint=endpoint)
+            start = time.perf_counter()
+            try:
+                response = super().request(method, route, params=params, json=json, user_auth=user_auth)
+            except tweepy.TooManyRequests as e:
+                metrics.inc('tweetgen_api_requests_total', endpoint=endpoint, status='429')
+                bucket.backoff(e.response.headers)
+                if attempt == self.max_retries:
+                    raise
+                continue
+            except Exception:
+                metrics.inc('tweetgen_api_requests_total', endpoint=endpoint, status='error')
+                raise
+            finally:
+                metrics.observe('tweetgen_api_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+            metrics.inc('tweetgen_api_requests_total', endpoint=endpoint, status='ok')
+            bucket.update(response.headers)
+            return response
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
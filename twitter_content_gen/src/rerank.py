@@ -0,0 +1,88 @@
+# src/rerank.py
+from typing import List
+
+import numpy as np
+import torch
+
+import config
+
+
+class CandidateScorer:
+    """
+    Score sampled tweet candidates so only the best of each request is kept.
+
+    The score adds up three terms, each weighted by config.RERANK_WEIGHTS:
+
+    - fluency: minus the mean token log-loss of the continuation under the
+      model, i.e. -log(perplexity), from one batched forward pass
+    - length: how much of the character budget the continuation fills
+    - topics: share of the prompt's topics the continuation mentions
+    """
+
+    def __init__(self, model, tokenizer, weights: dict = config.RERANK_WEIGHTS,
+                 batch_size: int = config.RERANK_SCORE_BATCH_SIZE):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.weights = weights
+        self.batch_size = batch_size
+
+    def log_perplexity(self, prompts: List[str], continuations: List[str]) -> np.ndarray:
+        """Mean negative log-likelihood of each continuation given its prompt (inf when empty)"""
+        prompt_lengths = [len(ids) for ids in self.tokenizer(prompts)['input_ids']]
+        full_ids = self.tokenizer([p + c for p, c in zip(prompts, continuations)])['input_ids']
+        losses = []
+        for start in range(0, len(full_ids), self.batch_size):
+            rows = full_ids[start:start + self.batch_size]
+            width = max(len(ids) for ids in rows)
+            # Padded on the right so positions match unpadded decoding for every backend
+            input_ids = torch.full((len(rows), width), self.tokenizer.pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(rows), width), dtype=torch.long)
+            for i, ids in enumerate(rows):
+                input_ids[i, :len(ids)] = torch.tensor(ids)
+                attention_mask[i, :len(ids)] = 1
+
+            with torch.no_grad():
+                logits = self.model(input_ids=input_ids, attention_mask=attention_mask).logits[:, :-1]
+            targets = input_ids[:, 1:]
+            token_loss = torch.nn.functional.cross_entropy(logits.transpose(1, 2).float(), targets,
+                                                           reduction='none')
+
+            # Target j is token j + 1, so continuation tokens start at target prompt_length - 1
+            positions = torch.arange(width - 1)
+            first = torch.tensor(prompt_lengths[start:start + len(rows)])[:, None] - 1
+            mask = (positions >= first) & attention_mask[:, 1:].bool()
+            counts = mask.sum(dim=1)
+            loss = (token_loss * mask).sum(dim=1) / counts.clamp(min=1)
+            losses.append(torch.where(counts > 0, loss, torch.full_like(loss, float('inf'))).numpy())
+        return np.concatenate(losses) if losses else np.empty(0)
+
+    def score(self, prompts: List[str], continuations: List[str], topics: List[List[str]],
+              char_budgets: List[int]) -> np.ndarray:
+        """
+        Score candidates; higher is better
+
+        Args:
+            prompts: Prompt of each candidate
+            continuations: Sampled text after the prompt
+            topics: Topics each candidate was prompted with
+            char_budgets: Characters available to each continuation, excluding its prompt
+
+        Returns:
+            float array with one score per candidate
+        """
+        fluency = -self.log_perplexity(prompts, continuations)
+
+        lengths = np.array([len(text.strip()) for text in continuations], dtype=float)
+        length_fit = np.clip(lengths / np.asarray(char_budgets, dtype=float), 0.0, 1.0)
+
+        # Topics are padded into a (candidates, topics) matrix and matched as substrings in one call
+        width = max((len(t) for t in topics), default=0)
+        topic_matrix = np.array([[topic.lower() for topic in t] + [''] * (width - len(t)) for t in topics],
+                                dtype=str).reshape(len(topics), width)
+        lowered = np.array([text.lower() for text in continuations], dtype=str)[:, None]
+        mentioned = (np.char.find(lowered, topic_matrix) >= 0) & (topic_matrix != '')
+        coverage = mentioned.sum(axis=1) / np.maximum((topic_matrix != '').sum(axis=1), 1)
+
+        return (self.weights['fluency'] * fluency
+                + self.weights['length'] * length_fit
+                + self.weights['topics'] * coverage)
@@ -0,0 +1,72 @@
+# src/speculative_benchmark.py
+import argparse
+import statistics
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+import config
+from tweet_generator import TweetGenerator
+
+
+def benchmark(tweets_df: pd.DataFrame, model_name: str = config.MODEL_NAME,
+              draft_model: str = 'distilgpt2', runs: int = 20,
+              backend: str = config.INFERENCE_BACKEND) -> List[Dict]:
+    """
+    Time single-tweet generation with and without a speculative draft model
+
+    Args:
+        tweets_df: Collected tweets to draw topics and hashtags from
+        model_name: Main model name or checkpoint path
+        draft_model: Draft model proposing tokens, e.g. 'distilgpt2'
+        runs: Tweets generated per configuration
+        backend: Inference backend of the main model
+
+    Returns:
+        One result dictionary per configuration
+    """
+    import torch
+
+    # One sample per tweet without reranking or duplicate rejection, so each run is exactly one decode
+    single = dict(n=1, candidates=1, reject_duplicates=False)
+    results = []
+    for draft in (None, draft_model):
+        generator = TweetGenerator(model_name, backend, draft_model=draft)
+        generator.generate_batch(tweets_df, **single)  # Load models and warm up
+        torch.manual_seed(0)
+
+        latencies, chars = [], 0
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = generator.generate_batch(tweets_df, **single)[0]
+            latencies.append(time.perf_counter() - start)
+            chars += len(result.get('ready_to_post', ''))
+
+        latencies.sort()
+        results.append({
+            'mode': f"assisted ({draft})" if draft else 'baseline',
+            'mean_ms': 1000 * statistics.mean(latencies),
+            'p50_ms': 1000 * latencies[len(latencies) // 2],
+            'p90_ms': 1000 * latencies[int(len(latencies) * 0.9) - 1],
+            'chars_per_second': chars / sum(latencies)
+        })
+
+    baseline = results[0]['mean_ms']
+    print(f"\n{'mode':<30} {'mean ms':>9} {'p50 ms':>9} {'p90 ms':>9} {'chars/s':>9} {'speedup':>8}")
+    for r in results:
+        print(f"{r['mode']:<30} {r['mean_ms']:>9.1f} {r['p50_ms']:>9.1f} {r['p90_ms']:>9.1f} "
+              f"{r['chars_per_second']:>9.1f} {baseline / r['mean_ms']:>7.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark speculative decoding on tweet-length outputs")
+    parser.add_argument('--model', default=config.MODEL_NAME, help="Main model name or checkpoint path")
+    parser.add_argument('--draft', default='distilgpt2', help="Draft model name or checkpoint path")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--corpus', default='data/raw/test_tweets.csv',
+                        help="CSV of collected tweets to take topics from")
+    args = parser.parse_args()
+
+    benchmark(pd.read_csv(args.corpus), args.model, args.draft, args.runs)
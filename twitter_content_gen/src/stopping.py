@@ -0,0 +1,37 @@
+# src/stopping.py
+import re
+from typing import List
+
+import torch
+from transformers import StoppingCriteria
+
+# A sentence ends with . ! or ?, optionally followed by closing quotes or brackets
+SENTENCE_END = re.compile(r'[.!?]+["\'\)\]]*$')
+
+
+class TweetBudgetCriteria(StoppingCriteria):
+    """
+    Stop each sequence once it can no longer become a postable tweet.
+
+    A row is finished when its decoded text reaches its character budget, or
+    when the continuation ends a sentence after the text is at least
+    min_chars long. Rows finish independently within a batch.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, prefix_chars: List[int],
+                 char_budgets: List[int], min_chars: int):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.prefix_chars = prefix_chars
+        self.char_budgets = char_budgets
+        self.min_chars = min_chars
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        continuations = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        done = []
+        for text, prefix, budget in zip(continuations, self.prefix_chars, self.char_budgets):
+            length = prefix + len(text)
+            stripped = text.rstrip()
+            ends_sentence = bool(stripped) and SENTENCE_END.search(stripped) is not None
+            done.append(length >= budget or (length >= self.min_chars and ends_sentence))
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,132 @@
+# src/streaming.py
+import asyncio
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, Optional
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+# Same removals, in the same order, as TweetGenerator.clean_tweet; neither matches across whitespace
+URL_PATTERN = re.compile(r'http\S+|www\S+|https\S+')
+MENTION_PATTERN = re.compile(r'@\w+')
+_LAST_SPACE = re.compile(r'\s(?=\S*$)')
+
+
+class IncrementalCleaner:
+    """
+    Clean tweet text that arrives in pieces, releasing it word by word.
+
+    The text after the last whitespace is held back, since it may still grow
+    into a URL or mention. Released text has URLs and mentions removed and
+    single spaces between words, exactly as clean_tweet would produce.
+    """
+
+    def __init__(self):
+        self._pending = ''
+        self.text = ''
+
+    def _release(self, text: str) -> str:
+        cleaned = ' '.join(MENTION_PATTERN.sub('', URL_PATTERN.sub('', text)).split())
+        if not cleaned:
+            return ''
+        piece = (' ' if self.text else '') + cleaned
+        self.text += piece
+        return piece
+
+    def feed(self, piece: str) -> str:
+        """Add generated text; returns the cleaned text that is now final (may be empty)"""
+        text = self._pending + piece
+        match = _LAST_SPACE.search(text)
+        if match is None:
+            self._pending = text
+            return ''
+        self._pending = text[match.end():]
+        return self._release(text[:match.start()])
+
+    def finish(self) -> str:
+        """Release the held-back word and end the text with punctuation, as clean_tweet does"""
+        piece = self._release(self._pending)
+        self._pending = ''
+        if self.text and self.text[-1] not in '.!?':
+            piece += '.'
+            self.text += '.'
+        return piece
+
+
+class _Cancelled(StoppingCriteria):
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+def stream_generate(model, tokenizer, inputs, stopping_criteria: Optional[StoppingCriteriaList] = None,
+                    **generate_kwargs) -> Iterator[str]:
+    """
+    Run model.generate in a background thread and yield decoded text as tokens arrive
+
+    Only the continuation is yielded, not the prompt. Closing the iterator
+    early stops decoding at the next token.
+    """
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    cancelled = threading.Event()
+    criteria = StoppingCriteriaList(stopping_criteria or [])
+    criteria.append(_Cancelled(cancelled))
+    errors = []
+
+    def run():
+        try:
+            with torch.no_grad():
+                model.generate(**inputs, streamer=streamer, stopping_criteria=criteria, **generate_kwargs)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=run, name='generation-stream', daemon=True)
+    thread.start()
+    try:
+        for piece in streamer:
+            if piece:
+                yield piece
+    finally:
+        cancelled.set()
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def clean_stream(pieces: Iterator[str], cleaner: Optional[IncrementalCleaner] = None) -> Iterator[str]:
+    """Yield the cleaned form of streamed text, ending with the held-back remainder"""
+    cleaner = cleaner or IncrementalCleaner()
+    for piece in pieces:
+        cleaned = cleaner.feed(piece)
+        if cleaned:
+            yield cleaned
+    final = cleaner.finish()
+    if final:
+        yield final
+
+
+async def astream(pieces: Iterator[str]) -> AsyncIterator[str]:
+    """
+    Expose a blocking iterator as an async generator
+
+    Each step runs on a dedicated worker thread, so the event loop keeps
+    serving other tasks while tokens are decoded.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1)
+    done = object()
+    try:
+        while True:
+            piece = await loop.run_in_executor(executor, next, pieces, done)
+            if piece is done:
+                break
+            yield piece
+    finally:
+        # Queued behind any step still running, so the generator is never closed mid-step
+        executor.submit(pieces.close)
+        executor.shutdown(wait=False)
@@ -0,0 +1,39 @@
+# src/test_topic_index.py
+import pandas as pd
+
+from topic_index import STOP_WORDS, TopicIndex
+from tweet_generator import TweetGenerator
+
+TEXTS = [
+    'Merci @Renée_Dupré pour la conférence sur les modèles',
+    'Reading https://example.com/a about transformers tonight',
+    'Slides at www.example.org/deck then questions about tokenizers today',
+    'Thread https://t.co/abc lifetimes explained simply',
+    '@Ωmega_42 thanks, compilers were fun',
+    'Write a tweet about: attention heads and caching',
+    'Plain tweet without anything special',
+]
+
+
+def scan_topics(texts):
+    """Topics as the per-tweet scan over TweetGenerator.clean_tweet found them"""
+    generator = TweetGenerator()
+    topics = []
+    for text in texts:
+        for word in generator.clean_tweet(text).lower().split():
+            if len(word) > 3 and word not in STOP_WORDS and word not in topics:
+                topics.append(word)
+    return topics
+
+
+def test_topics_match_clean_tweet():
+    index = TopicIndex.from_dataframe(pd.DataFrame({'text': TEXTS}))
+    assert index.topics == scan_topics(TEXTS)
+    assert not any('dupré' in topic or 'ωmega' in topic for topic in index.topics)
+    # Words after a URL ending in non-ASCII whitespace are kept
+    assert {'then', 'tokenizers', 'lifetimes'} <= set(index.topics)
+
+
+if __name__ == "__main__":
+    test_topics_match_clean_tweet()
+    print("Topic extraction matches clean_tweet")
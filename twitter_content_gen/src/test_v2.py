@@ -1,4 +1,5 @@
-from data_collection import collect_tweets, save_tweets
+from data_collection import collect_tweets
+from tweet_store import raw_store, generated_store
 from tweet_generator import TweetGenerator
 import time
 import pandas as pd
@@ -27,7 +28,7 @@ def test_collection():
                 os.makedirs('data/generated', exist_ok=True)
                 
                 # Save collected tweets
-                save_tweets(tweets_df, 'test_tweets.csv')
+                raw_store().append(tweets_df)
                 print(f"\nSuccessfully collected {len(tweets_df)} tweets!")
                 print("\nSample of collected tweets:")
                 print(tweets_df[['username', 'text']].head())
@@ -40,17 +41,17 @@ def test_collection():
                 print("\n📱 READY TO POST TWEETS 📱")
                 print("(Copy any of these tweets below and paste directly to Twitter)\n")
                 
-                for i in range(3):
-                    result = generator.generate_tweet(tweets_df)
-                    
+                results = generator.generate_batch(tweets_df, n=3)
+                for i, result in enumerate(results):
                     if 'error' not in result:
                         # Store analysis version
                         generated_tweets.append({
                             'tweet_number': i + 1,
                             'base_text': result['analysis']['base_text'],
-                            'topics': str(result['analysis']['topics']),
-                            'hashtags': str(result['analysis']['hashtags']),
-                            'timestamp': datetime.now()
+                            'ready_to_post': result['ready_to_post'],
+                            'topics': result['analysis']['topics'],
+                            'hashtags': result['analysis']['hashtags'],
+                            'generated_at': datetime.now()
                         })
                         
                         # Store and display ready-to-post version
@@ -70,10 +71,10 @@ def test_collection():
                 
                 # Save both versions
                 if generated_tweets:
-                    # Save analysis version
-                    analysis_df = pd.DataFrame(generated_tweets)
-                    analysis_df.to_csv('data/generated/generated_tweets_analysis.csv', 
-                                     index=False, encoding='utf-8')
+                    # Append analysis version to the generated store
+                    generated_store().append(pd.DataFrame(generated_tweets))
+                    # Later runs reject candidates that repeat these tweets
+                    generator.mark_posted(results)
                     
                     # Save ready-to-post version
                     ready_df = pd.DataFrame(ready_to_post_tweets)
@@ -81,7 +82,7 @@ def test_collection():
                                   index=False, encoding='utf-8')
                     
                     print("\n✅ Generated tweets saved to:")
-                    print("- data/generated/generated_tweets_analysis.csv (Analysis version)")
+                    print(f"- {generated_store().root} (Analysis version)")
                     print("- data/generated/ready_to_post_tweets.csv (Ready to post version)")
                 break
             else:
@@ -0,0 +1,122 @@
+# src/topic_index.py
+import random
+from typing import List, Dict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from preprocessing import ARROW_URL_PATTERN
+
+# Same cleaning rules as TweetGenerator.clean_tweet, applied column-wise by pyarrow's
+# RE2 engine, so \w and \S are spelled out to match non-ASCII text as Python's re does
+PROMPT_PATTERN = r'^Write.*?about.*?:'
+MENTION_PATTERN = r'@[\p{L}\p{N}_]+'
+QUOTED_TAG_PATTERN = r'''['"]([^'"]+)['"]'''
+
+STOP_WORDS = {'the', 'is', 'at', 'which', 'on', 'a', 'an', 'and', 'or', 'but', 'write', 'tweet', 'about'}
+
+
+class TopicIndex:
+    """
+    Deduplicated topic words and hashtags for a tweet corpus.
+
+    Built once per corpus and extended with update() as new tweets arrive,
+    so generation calls can sample topics without rescanning the DataFrame.
+    """
+
+    def __init__(self):
+        self._topics: List[str] = []
+        self._topic_set = set()
+        self._hashtags: List[str] = []
+        self._hashtag_set = set()
+        self.tweet_count = 0
+
+    @classmethod
+    def from_dataframe(cls, tweets_df: pd.DataFrame) -> 'TopicIndex':
+        index = cls()
+        index.update(tweets_df)
+        return index
+
+    @classmethod
+    def from_store(cls, store, usernames: List[str] = None, batch_size: int = 100_000) -> 'TopicIndex':
+        """Build an index from a TweetStore, reading only the text and hashtags columns in batches"""
+        index = cls()
+        for batch in store.iter_batches(columns=['text', 'hashtags'], batch_size=batch_size,
+                                        usernames=usernames):
+            index.update(batch)
+        return index
+
+    @property
+    def topics(self) -> List[str]:
+        return list(self._topics)
+
+    @property
+    def hashtags(self) -> List[str]:
+        return list(self._hashtags)
+
+    def update(self, tweets_df: pd.DataFrame) -> None:
+        """
+        Add the topics and hashtags of new tweets to the index
+
+        Args:
+            tweets_df: DataFrame with a 'text' column and optionally 'hashtags'
+        """
+        if tweets_df is None or tweets_df.empty:
+            return
+
+        self._add(self._topics, self._topic_set, self._extract_topics(tweets_df['text']))
+        if 'hashtags' in tweets_df.columns:
+            self._add(self._hashtags, self._hashtag_set, self._extract_hashtags(tweets_df['hashtags']))
+        self.tweet_count += len(tweets_df)
+
+    def sample_topics(self, k: int = 3) -> List[str]:
+        return random.sample(self._topics, min(k, len(self._topics)))
+
+    def sample_hashtags(self, k: int = 3) -> List[str]:
+        return random.sample(self._hashtags, min(k, len(self._hashtags)))
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {
+            'topics': self.topics,
+            'hashtags': self.hashtags
+        }
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    @staticmethod
+    def _add(items: List[str], seen: set, new_items: pd.Series) -> None:
+        for item in new_items.unique():
+            if item not in seen:
+                seen.add(item)
+                items.append(item)
+
+    @staticmethod
+    def _extract_topics(texts: pd.Series) -> pd.Series:
+        array = pa.array(texts.fillna('').astype(str), type=pa.string(), from_pandas=True)
+        for pattern in (PROMPT_PATTERN, ARROW_URL_PATTERN, MENTION_PATTERN):
+            array = pc.replace_substring_regex(array, pattern, '')
+        cleaned = pc.utf8_trim_whitespace(array).to_pandas().set_axis(texts.index)
+        # clean_tweet closes every tweet with a full stop, which sticks to the last word
+        needs_stop = (cleaned.str.len() > 0) & ~cleaned.str[-1:].isin(['.', '!', '?'])
+        cleaned = cleaned.where(~needs_stop, cleaned + '.')
+
+        words = cleaned.str.lower().str.split().explode().dropna()
+        return words[(words.str.len() > 3) & ~words.isin(STOP_WORDS)]
+
+    @staticmethod
+    def _extract_hashtags(hashtags: pd.Series) -> pd.Series:
+        hashtags = hashtags.dropna()
+        # Native list columns arrive as lists, or as numpy arrays when read from Parquet
+        is_list = hashtags.map(lambda tags: isinstance(tags, (list, np.ndarray)))
+        from_lists = hashtags[is_list].explode()
+
+        # Hashtags stored as stringified lists, e.g. "['ai', 'ml']", or a single bare tag
+        strings = hashtags[~is_list].astype(str)
+        is_repr = strings.str.startswith('[')
+        from_reprs = strings[is_repr].str.findall(QUOTED_TAG_PATTERN).explode()
+        bare = strings[~is_repr]
+
+        tags = pd.concat([from_lists, from_reprs, bare]).dropna().astype(str)
+        return tags[tags.str.len() > 0]
@@ -0,0 +1,120 @@
+# src/training_data.py
+import hashlib
+import os
+from typing import Dict, Iterable, List
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+import config
+
+
+def corpus_hash(texts: List[str], tokenizer_name: str, block_size: int) -> str:
+    """Content hash of a corpus and the settings its token IDs depend on"""
+    digest = hashlib.sha256(f"{tokenizer_name}\0{block_size}\0".encode('utf-8'))
+    for text in texts:
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def pack(token_lists: Iterable[List[int]], eos_token_id: int, block_size: int):
+    """
+    Pack tokenized tweets into blocks of at most block_size tokens
+
+    Tweets are kept whole and separated by EOS; a tweet that does not fit
+    starts the next block, and tweets longer than a block are truncated.
+
+    Returns:
+        Tuple of (flat token array, block start offsets with a final end offset)
+    """
+    ids, offsets = [], [0]
+    block_length = 0
+    for tokens in token_lists:
+        tokens = tokens[:block_size - 1] + [eos_token_id]
+        if block_length and block_length + len(tokens) > block_size:
+            offsets.append(len(ids))
+            block_length = 0
+        ids.extend(tokens)
+        block_length += len(tokens)
+    if block_length:
+        offsets.append(len(ids))
+    return np.asarray(ids, dtype=np.int32), np.asarray(offsets, dtype=np.int64)
+
+
+class PackedTweetDataset(Dataset):
+    """
+    Causal LM dataset of tweets pre-tokenized once and packed into blocks.
+
+    Token IDs are cached on disk under a hash of the corpus, so later runs on
+    the same texts skip tokenization and memory-map the cached arrays.
+    """
+
+    def __init__(self, texts: List[str], tokenizer, block_size: int = config.BLOCK_SIZE,
+                 cache_dir: str = config.DATASET_CACHE_DIR):
+        texts = [str(text) for text in texts]
+        key = corpus_hash(texts, tokenizer.name_or_path, block_size)
+        self.cache_path = os.path.join(cache_dir, f"packed-{key}")
+        ids_path = os.path.join(self.cache_path, 'ids.npy')
+        offsets_path = os.path.join(self.cache_path, 'offsets.npy')
+
+        if os.path.exists(offsets_path):
+            self.ids = np.load(ids_path, mmap_mode='r')
+            self.offsets = np.load(offsets_path)
+            print(f"Loaded {len(self)} cached training blocks from {self.cache_path}")
+            return
+
+        token_lists = tokenizer(texts, add_special_tokens=False)['input_ids']
+        self.ids, self.offsets = pack(token_lists, tokenizer.eos_token_id, block_size)
+        os.makedirs(self.cache_path, exist_ok=True)
+        np.save(ids_path, self.ids)
+        # Written last, so its presence marks a complete cache entry
+        np.save(offsets_path, self.offsets)
+        print(f"Packed {len(texts)} tweets into {len(self)} training blocks")
+
+    @classmethod
+    def load(cls, cache_path: str) -> 'PackedTweetDataset':
+        """Open a complete cache entry directly, e.g. one recorded by an earlier pipeline run"""
+        if not os.path.exists(os.path.join(cache_path, 'offsets.npy')):
+            raise FileNotFoundError(f"No complete packed dataset at {cache_path}")
+        dataset = cls.__new__(cls)
+        dataset.cache_path = cache_path
+        dataset.ids = np.load(os.path.join(cache_path, 'ids.npy'), mmap_mode='r')
+        dataset.offsets = np.load(os.path.join(cache_path, 'offsets.npy'))
+        return dataset
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return {'input_ids': torch.from_numpy(np.array(self.ids[start:end], dtype=np.int64))}
+
+
+class PackedBlockCollator:
+    """
+    Batch packed blocks for causal LM training.
+
+    Blocks are padded on the right, so every block keeps the positions it
+    would have on its own, and only the padding is left out of the loss. The
+    EOS separators inside a block are learned like any other token, even
+    though GPT-2 pads with the same ID.
+    """
+
+    def __init__(self, pad_token_id: int):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, examples: List[Dict[str, torch.Tensor]]) -> Dict[str, torch.Tensor]:
+        blocks = [example['input_ids'] for example in examples]
+        length = max(len(block) for block in blocks)
+        input_ids = torch.full((len(blocks), length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(blocks), length), dtype=torch.long)
+        for row, block in enumerate(blocks):
+            input_ids[row, :len(block)] = block
+            attention_mask[row, :len(block)] = 1
+        return {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'labels': input_ids.masked_fill(attention_mask == 0, -100),
+        }
@@ -1,13 +1,47 @@
-from transformers import pipeline, set_seed
-import random
 import re
-from typing import List, Dict
+import time
+from typing import AsyncIterator, Dict, Iterator, List
+import numpy as np
 import pandas as pd
+import config
+import metrics
+import model_registry
+from near_duplicates import NearDuplicateIndex
+from topic_index import TopicIndex
+
+# Every prompt starts with this template; the space before the topics belongs to the suffix
+PROMPT_PREFIX = "Generate a tweet:"
 
 class TweetGenerator:
-    def __init__(self):
-        self.generator = pipeline('text-generation', model='gpt2')
-        set_seed(42)
+    def __init__(self, model_name: str = config.MODEL_NAME, backend: str = config.INFERENCE_BACKEND,
+                 draft_model: str = config.SPECULATIVE_DRAFT_MODEL):
+        # The model is loaded from the shared registry on first generation
+        self.model_name = model_name
+        self.backend = backend
+        # Optional small model that proposes tokens for the main model to verify
+        self.draft_model = draft_model
+        self._model = None
+        self._tokenizer = None
+        self._draft = None
+        self._scorer = None
+        self._index = None
+        self._index_source = None
+        self._similarity = None
+        self._similarity_source = None
+        self._similarity_count = 0
+        self._posted = None
+
+    def _load(self):
+        if self._model is None:
+            from transformers import set_seed
+
+            self._model, self._tokenizer = model_registry.get_model(self.model_name, self.backend)
+            if self.draft_model:
+                # ONNX Runtime models cannot act as assistants, so the draft then runs on torch
+                draft_backend = 'torch' if self.backend == 'onnx' else self.backend
+                self._draft = model_registry.get_model(self.draft_model, draft_backend)[0]
+            set_seed(42)
+        return self._model, self._tokenizer
         
     def clean_tweet(self, tweet: str) -> str:
         # Remove the prompt text if present
@@ -33,95 +67,331 @@ class TweetGenerator:
                 return '. '.join(complete_sentences) + '.'
         return text
 
+    def topic_index(self, tweets_df) -> TopicIndex:
+        """Return the topic index for tweets_df, building or extending it only when the corpus changes"""
+        if isinstance(tweets_df, TopicIndex):
+            return tweets_df
+        if self._index is None or tweets_df is not self._index_source:
+            self._index = TopicIndex.from_dataframe(tweets_df)
+            self._index_source = tweets_df
+        elif len(tweets_df) > self._index.tweet_count:
+            # Same corpus object with rows appended since the last call
+            self._index.update(tweets_df.iloc[self._index.tweet_count:])
+        return self._index
+
     def extract_topics_and_hashtags(self, tweets_df) -> Dict[str, List[str]]:
-        topics = []
-        hashtags = []
-        
-        for _, row in tweets_df.iterrows():
-            clean_text = self.clean_tweet(row['text'])
-            words = set(clean_text.lower().split())
-            stop_words = {'the', 'is', 'at', 'which', 'on', 'a', 'an', 'and', 'or', 'but', 'write', 'tweet', 'about'}
-            topics.extend([w for w in words if w not in stop_words and len(w) > 3])
-            
-            if 'hashtags' in row and row['hashtags']:
-                if isinstance(row['hashtags'], list):
-                    hashtags.extend(row['hashtags'])
-                elif isinstance(row['hashtags'], str):
-                    tags = eval(row['hashtags']) if row['hashtags'].startswith('[') else [row['hashtags']]
-                    hashtags.extend(tags)
+        return self.topic_index(tweets_df).to_dict()
+    
+    def similarity_index(self, tweets_df) -> NearDuplicateIndex:
+        """
+        Return the near-duplicate index of the source corpus, kept in step with tweets_df like topic_index
+
+        A prebuilt TopicIndex carries no texts, so the corpus index saved by
+        preprocessing is used instead.
+        """
+        from preprocessing import clean_texts
+
+        if isinstance(tweets_df, TopicIndex):
+            if self._similarity_source is not TopicIndex:
+                self._similarity = NearDuplicateIndex.open(config.CORPUS_INDEX_PATH)
+                self._similarity_source = TopicIndex
+            return self._similarity
+        if self._similarity is None or tweets_df is not self._similarity_source:
+            self._similarity = NearDuplicateIndex()
+            self._similarity_source = tweets_df
+            self._similarity_count = 0
+        if len(tweets_df) > self._similarity_count:
+            texts = clean_texts(tweets_df['text'].iloc[self._similarity_count:])
+            self._similarity.add(texts[texts.str.len() > 0])
+            self._similarity_count = len(tweets_df)
+        return self._similarity
+
+    @property
+    def posted_index(self) -> NearDuplicateIndex:
+        """Near-duplicate index of tweets already marked as posted, persisted across runs"""
+        if self._posted is None:
+            self._posted = NearDuplicateIndex.open(config.POSTED_INDEX_PATH)
+        return self._posted
+
+    def mark_posted(self, results: List[Dict]) -> None:
+        """Record generated tweets as posted, so later candidates that repeat them are rejected"""
+        texts = [result['analysis']['base_text'] for result in results if 'error' not in result]
+        if texts:
+            self.posted_index.add(texts)
+            self.posted_index.save(config.POSTED_INDEX_PATH)
+
+    def _format_tweet(self, generated: str, selected_topics: List[str], selected_hashtags: List[str]) -> Dict:
+        """Turn raw model output into the analysis / ready-to-post pair"""
+        # Clean and format the tweet
+        cleaned_tweet = self.clean_tweet(generated)
+        complete_tweet = self.ensure_complete_sentence(cleaned_tweet)
         
-        return {
-            'topics': list(set(topics)),
-            'hashtags': list(set(hashtags))
+        # Create analysis version
+        analysis_tweet = {
+            'base_text': complete_tweet,
+            'topics': selected_topics,
+            'hashtags': selected_hashtags
         }
-    
-    def generate_tweet(self, tweets_df, max_length: int = 280) -> Dict:
-        content = self.extract_topics_and_hashtags(tweets_df)
-        topics = content['topics']
-        hashtags = content['hashtags']
         
-        if not topics:
-            return {"error": "No topics found"}
-            
-        selected_topics = random.sample(topics, min(3, len(topics)))
-        prompt = f"Generate a tweet: {', '.join(selected_topics)}"
+        # Create ready-to-post version
+        ready_to_post = complete_tweet
+        if selected_hashtags:
+            hashtag_text = ' ' + ' '.join([f'#{tag}' for tag in selected_hashtags])
+            if len(ready_to_post + hashtag_text) <= 280:
+                ready_to_post += hashtag_text
+            else:
+                # If adding all hashtags would make it too long, add as many as will fit
+                for tag in selected_hashtags:
+                    if len(ready_to_post + f' #{tag}') <= 276:
+                        ready_to_post += f' #{tag}'
+                    else:
+                        break
         
-        try:
-            # Generate base tweet with more space for processing
-            generated = self.generator(
-                prompt,
-                max_length=max_length - 50,  # Leave more room for processing
+        # Final check for length and completeness
+        if len(ready_to_post) > 280:
+            # Find the last complete sentence that fits
+            sentences = re.split(r'([.!?]+)', ready_to_post)
+            ready_to_post = ''
+            for i in range(0, len(sentences)-1, 2):
+                if len(ready_to_post + sentences[i] + sentences[i+1]) <= 280:
+                    ready_to_post += sentences[i] + sentences[i+1]
+                else:
+                    break
+        
+        return {
+            'analysis': analysis_tweet,
+            'ready_to_post': ready_to_post.strip()
+        }
+
+    @staticmethod
+    def _hashtag_room(hashtags: List[str]) -> int:
+        return len(' ' + ' '.join(f'#{tag}' for tag in hashtags)) if hashtags else 0
+
+    def _generate(self, inputs, prompts: List[str], char_budgets: List[int], **kwargs) -> List[str]:
+        import torch
+        from transformers import StoppingCriteriaList
+        from stopping import TweetBudgetCriteria
+
+        model, tokenizer = self._load()
+        prompt_length = inputs['input_ids'].shape[1]
+        criteria = TweetBudgetCriteria(tokenizer, prompt_length, [len(p) for p in prompts],
+                                       char_budgets, config.MIN_TWEET_CHARS)
+        
+        with torch.no_grad(), metrics.timer('tweetgen_decode_seconds'):
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=config.MAX_NEW_TOKENS,
                 num_return_sequences=1,
                 temperature=0.9,
-                do_sample=True
-            )[0]['generated_text']
-            
-            # Clean and format the tweet
-            cleaned_tweet = self.clean_tweet(generated)
-            complete_tweet = self.ensure_complete_sentence(cleaned_tweet)
-            
-            # Select and format hashtags
-            selected_hashtags = []
-            if hashtags:
-                num_hashtags = min(3, len(hashtags))
-                selected_hashtags = random.sample(hashtags, num_hashtags)
-            
-            # Create analysis version
-            analysis_tweet = {
-                'base_text': complete_tweet,
-                'topics': selected_topics,
-                'hashtags': selected_hashtags
-            }
-            
-            # Create ready-to-post version
-            ready_to_post = complete_tweet
-            if selected_hashtags:
-                hashtag_text = ' ' + ' '.join([f'#{tag}' for tag in selected_hashtags])
-                if len(ready_to_post + hashtag_text) <= 280:
-                    ready_to_post += hashtag_text
-                else:
-                    # If adding all hashtags would make it too long, add as many as will fit
-                    for tag in selected_hashtags:
-                        if len(ready_to_post + f' #{tag}') <= 276:
-                            ready_to_post += f' #{tag}'
-                        else:
-                            break
+                do_sample=True,
+                stopping_criteria=StoppingCriteriaList([criteria]),
+                pad_token_id=tokenizer.pad_token_id,
+                **kwargs
+            )
+        
+        new_tokens = outputs[:, prompt_length:]
+        metrics.inc('tweetgen_tokens_generated_total', int((new_tokens != tokenizer.pad_token_id).sum()))
+        continuations = tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        return [prompt + continuation for prompt, continuation in zip(prompts, continuations)]
+
+    def _decode(self, prefix: str, suffixes: List[str], char_budgets: List[int]) -> List[str]:
+        """Sample continuations for a padded batch of prompts, stopping each at its character budget"""
+        model, tokenizer = self._load()
+        prompts = [prefix + suffix for suffix in suffixes]
+        
+        if self._draft is not None:
+            # Assisted decoding verifies draft tokens one sequence at a time; with sampling it
+            # accepts or resamples them so the output distribution matches the main model's
+            generated = []
+            for prompt, budget in zip(prompts, char_budgets):
+                inputs = tokenizer(prompt, return_tensors='pt')
+                generated.extend(self._generate(inputs, [prompt], [budget], assistant_model=self._draft))
+            return generated
+        
+        prefix_cache = model_registry.get_prefix_cache(self.model_name, self.backend)
+        if prefix_cache is not None:
+            # The template prefix is encoded once per model and reused by every batch item
+            inputs = prefix_cache.build_inputs(prefix, suffixes)
+        else:
+            inputs = tokenizer(prompts, return_tensors='pt', padding=True)
+        return self._generate(inputs, prompts, char_budgets)
+
+    @property
+    def scorer(self):
+        if self._scorer is None:
+            from rerank import CandidateScorer
+
+            self._scorer = CandidateScorer(*self._load())
+        return self._scorer
+
+    def _generate_round(self, index: TopicIndex, n: int, max_length: int, batch_size: int,
+                        candidates: int = 1) -> List[Dict]:
+        selected_topics = [index.sample_topics(3) for _ in range(n)]
+        # Hashtags are chosen up front so decoding can leave room for them
+        selected_hashtags = [index.sample_hashtags(3) for _ in range(n)]
+        # Every request is sampled `candidates` times from the same prompt
+        suffixes = [f" {', '.join(t)}" for t in selected_topics for _ in range(candidates)]
+        budgets = [max_length - self._hashtag_room(tags) for tags in selected_hashtags for _ in range(candidates)]
+        
+        try:
+            # One generate call per batch of prompts instead of one per tweet
+            generated = []
+            for start in range(0, len(suffixes), batch_size):
+                generated.extend(self._decode(PROMPT_PREFIX, suffixes[start:start + batch_size],
+                                              budgets[start:start + batch_size]))
             
-            # Final check for length and completeness
-            if len(ready_to_post) > 280:
-                # Find the last complete sentence that fits
-                sentences = re.split(r'([.!?]+)', ready_to_post)
-                ready_to_post = ''
-                for i in range(0, len(sentences)-1, 2):
-                    if len(ready_to_post + sentences[i] + sentences[i+1]) <= 280:
-                        ready_to_post += sentences[i] + sentences[i+1]
-                    else:
-                        break
+            if candidates > 1:
+                prompts = [PROMPT_PREFIX + suffix for suffix in suffixes]
+                # Decoding budgets cover the prompt too, the scorer only sees the continuation
+                continuation_budgets = [budget - len(prompt) for budget, prompt in zip(budgets, prompts)]
+                with metrics.timer('tweetgen_rerank_seconds'):
+                    scores = self.scorer.score(prompts, [text[len(prompt):] for text, prompt in zip(generated, prompts)],
+                                               [t for t in selected_topics for _ in range(candidates)],
+                                               continuation_budgets)
+                best = scores.reshape(n, candidates).argmax(axis=1) + candidates * np.arange(n)
+                generated = [generated[i] for i in best]
+        except Exception as e:
+            return [{"error": f"Error generating tweet: {str(e)}"} for _ in range(n)]
+        
+        results = []
+        for text, topics_used, hashtags_used in zip(generated, selected_topics, selected_hashtags):
+            try:
+                results.append(self._format_tweet(text, topics_used, hashtags_used))
+            except Exception as e:
+                results.append({"error": f"Error generating tweet: {str(e)}"})
+        return results
+
+    def generate_batch(self, tweets_df, n: int = 3, max_length: int = 280,
+                       batch_size: int = config.GENERATION_BATCH_SIZE,
+                       reject_duplicates: bool = True, candidates: int = config.RERANK_CANDIDATES) -> List[Dict]:
+        """
+        Generate several tweets, decoding the prompts together in padded batches
+        
+        Decoding stops per tweet at the first sentence end past MIN_TWEET_CHARS,
+        or once the text fills max_length minus the room its hashtags need.
+        Each tweet is sampled `candidates` times and the candidate with the best
+        fluency, length and topic coverage score is kept. Tweets that nearly
+        repeat a corpus tweet, a posted tweet or another tweet of the batch
+        are regenerated, up to DEDUPE_MAX_ATTEMPTS rounds.
+        
+        Args:
+            tweets_df: DataFrame of collected tweets, or a prebuilt TopicIndex
+            n: Number of tweets to generate
+            max_length: Character budget of the finished tweet (default: 280)
+            batch_size: Number of prompts decoded per forward pass
+            reject_duplicates: Regenerate near-duplicate tweets
+            candidates: Samples drawn per tweet for reranking (1 keeps the first sample).
+                With a draft model every sample is decoded on its own, so this
+                multiplies the latency of each tweet instead of widening a batch
             
-            return {
-                'analysis': analysis_tweet,
-                'ready_to_post': ready_to_post.strip()
-            }
+        Returns:
+            List of n result dicts, each in the same format as generate_tweet
+        """
+        start = time.perf_counter()
+        results = self._generate_batch(tweets_df, n, max_length, batch_size, reject_duplicates, candidates)
+        # Every tweet of a batch waits for the whole batch
+        metrics.observe('tweetgen_tweet_latency_seconds', time.perf_counter() - start, count=n)
+        errors = sum('error' in result for result in results)
+        metrics.inc('tweetgen_tweets_generated_total', n - errors, status='ok')
+        if errors:
+            metrics.inc('tweetgen_tweets_generated_total', errors, status='error')
+        return results
+
+    def _generate_batch(self, tweets_df, n: int, max_length: int, batch_size: int,
+                        reject_duplicates: bool, candidates: int) -> List[Dict]:
+        index = self.topic_index(tweets_df)
+        
+        if not len(index):
+            return [{"error": "No topics found"} for _ in range(n)]
+        if not reject_duplicates:
+            return self._generate_round(index, n, max_length, batch_size, candidates)
+        
+        references = [self.similarity_index(tweets_df), self.posted_index]
+        accepted = NearDuplicateIndex()
+        results = [None] * n
+        pending = list(range(n))
+        for _ in range(config.DEDUPE_MAX_ATTEMPTS):
+            rejected = []
+            drafts = self._generate_round(index, len(pending), max_length, batch_size, candidates)
+            for i, result in zip(pending, drafts):
+                if 'error' not in result:
+                    text = result['analysis']['base_text']
+                    if any(reference.is_duplicate(text) for reference in references + [accepted]):
+                        rejected.append(i)
+                        continue
+                    accepted.add([text])
+                results[i] = result
+            pending = rejected
+            if not pending:
+                break
+        
+        for i in pending:
+            results[i] = {"error": "Only near-duplicates of existing tweets were generated"}
+        return results
+    
+    @metrics.profiled('generate_tweet')
+    def generate_tweet(self, tweets_df, max_length: int = 280) -> Dict:
+        return self.generate_batch(tweets_df, n=1, max_length=max_length)[0]
+
+    def stream_tweet(self, tweets_df, max_length: int = 280) -> Iterator[str]:
+        """
+        Generate one tweet, yielding cleaned text pieces as tokens are decoded
+        
+        URLs and mentions are removed word by word as the text arrives. The
+        stream ends once the tweet reaches its character budget or a sentence
+        end, with the hashtags as its last piece. Streamed tweets skip
+        reranking and duplicate checks, which need the finished text.
+        
+        Args:
+            tweets_df: DataFrame of collected tweets, or a prebuilt TopicIndex
+            max_length: Character budget of the finished tweet (default: 280)
             
-        except Exception as e:
-            return {"error": f"Error generating tweet: {str(e)}"}
\ No newline at end of file
+        Yields:
+            Pieces of the ready-to-post tweet; joined, they form the whole tweet
+        """
+        from transformers import StoppingCriteriaList
+        from stopping import TweetBudgetCriteria
+        from streaming import IncrementalCleaner, clean_stream, stream_generate
+
+        index = self.topic_index(tweets_df)
+        if not len(index):
+            raise ValueError("No topics found")
+        
+        model, tokenizer = self._load()
+        topics, hashtags = index.sample_topics(3), index.sample_hashtags(3)
+        suffix = f" {', '.join(topics)}"
+        prefix_cache = model_registry.get_prefix_cache(self.model_name, self.backend)
+        if prefix_cache is not None and self._draft is None:
+            inputs = prefix_cache.build_inputs(PROMPT_PREFIX, [suffix])
+        else:
+            inputs = tokenizer(PROMPT_PREFIX + suffix, return_tensors='pt')
+        # Only the continuation is streamed, so its budget excludes the prompt
+        criteria = TweetBudgetCriteria(tokenizer, inputs['input_ids'].shape[1], [0],
+                                       [max_length - self._hashtag_room(hashtags)], config.MIN_TWEET_CHARS)
+        kwargs = {'assistant_model': self._draft} if self._draft is not None else {}
+        
+        cleaner = IncrementalCleaner()
+        yield from clean_stream(stream_generate(
+            model, tokenizer, inputs,
+            stopping_criteria=StoppingCriteriaList([criteria]),
+            max_new_tokens=config.MAX_NEW_TOKENS,
+            temperature=0.9,
+            do_sample=True,
+            pad_token_id=tokenizer.pad_token_id,
+            **kwargs
+        ), cleaner)
+        
+        tags = ''
+        for tag in hashtags:
+            if len(cleaner.text + tags + f' #{tag}') > max_length:
+                break
+            tags += f' #{tag}'
+        if tags:
+            yield tags
+
+    async def astream_tweet(self, tweets_df, max_length: int = 280) -> AsyncIterator[str]:
+        """Async generator form of stream_tweet; decoding runs off the event loop"""
+        from streaming import astream
+
+        async for piece in astream(self.stream_tweet(tweets_df, max_length)):
+            yield piece
@@ -0,0 +1,204 @@
+# src/tweet_store.py
+import hashlib
+import os
+import uuid
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+import config
+
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+
+RAW_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('username', pa.string()),
+    ('text', pa.string()),
+    ('created_at', TIMESTAMP),
+    ('likes', pa.int64()),
+    ('retweets', pa.int64()),
+    ('reply_count', pa.int64()),
+    ('quote_count', pa.int64()),
+    ('hashtags', pa.list_(pa.string())),
+    ('topics', pa.list_(pa.string())),
+    ('engagement', pa.int64()),
+    ('ingested_at', TIMESTAMP),
+])
+
+GENERATED_SCHEMA = pa.schema([
+    ('tweet_number', pa.int64()),
+    ('base_text', pa.string()),
+    ('ready_to_post', pa.string()),
+    ('topics', pa.list_(pa.string())),
+    ('hashtags', pa.list_(pa.string())),
+    ('generated_at', TIMESTAMP),
+])
+
+
+class TweetStore:
+    """
+    Append-only Parquet dataset with native list columns.
+
+    Every append() writes new files under hive-style partition directories
+    (e.g. username=jack/date=2024-12-22/), so nothing is ever rewritten.
+    Reads are projected to the requested columns, pruned by partition and
+    served from memory-mapped files.
+    """
+
+    def __init__(self, root: str, schema: pa.Schema, time_column: str,
+                 partition_by: List[str], key: Optional[str] = None):
+        self.root = root
+        self.schema = schema
+        self.time_column = time_column
+        self.partition_by = partition_by
+        self.key = key
+        self._partitioning = ds.partitioning(
+            pa.schema([(name, pa.string()) for name in partition_by]), flavor='hive'
+        )
+        self._filesystem = fs.LocalFileSystem(use_mmap=True)
+
+    def _dataset(self) -> Optional[ds.Dataset]:
+        if not os.path.isdir(self.root):
+            return None
+        return ds.dataset(self.root, schema=self._full_schema(), format='parquet',
+                          partitioning=self._partitioning, filesystem=self._filesystem)
+
+    def _full_schema(self) -> pa.Schema:
+        schema = self.schema
+        for name in self.partition_by:
+            if name not in schema.names:
+                schema = schema.append(pa.field(name, pa.string()))
+        return schema
+
+    def append(self, df: pd.DataFrame) -> int:
+        """
+        Write a batch of rows as new files in the store
+
+        Args:
+            df: DataFrame with (a subset of) the store's columns
+
+        Returns:
+            Number of rows written
+        """
+        if df is None or df.empty:
+            return 0
+        df = df.reindex(columns=self.schema.names).copy()
+        for field in self.schema:
+            if pa.types.is_timestamp(field.type):
+                df[field.name] = pd.to_datetime(df[field.name], utc=True, format='mixed')
+        if 'ingested_at' in self.schema.names:
+            # Rows are append-only; the latest ingested copy of a key wins on read
+            df['ingested_at'] = pd.Timestamp.now(tz='UTC')
+        if 'date' in self.partition_by:
+            df['date'] = df[self.time_column].dt.strftime('%Y-%m-%d')
+
+        table = pa.Table.from_pandas(df, schema=self._full_schema(), preserve_index=False)
+        os.makedirs(self.root, exist_ok=True)
+        ds.write_dataset(
+            table, self.root, format='parquet',
+            partitioning=self._partitioning,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore'
+        )
+        return len(df)
+
+    def _filter(self, usernames: Optional[List[str]], since: Optional[datetime]):
+        expression = None
+        if usernames is not None:
+            expression = ds.field('username').isin(list(usernames))
+        if since is not None:
+            since = pd.Timestamp(since)
+            since = since.tz_localize('UTC') if since.tzinfo is None else since.tz_convert('UTC')
+            time_filter = ds.field(self.time_column) >= pa.scalar(since.to_pydatetime(), type=TIMESTAMP)
+            if 'date' in self.partition_by:
+                # Lets the scan skip whole date directories
+                time_filter = (ds.field('date') >= since.strftime('%Y-%m-%d')) & time_filter
+            expression = time_filter if expression is None else expression & time_filter
+        return expression
+
+    def _columns(self, columns: Optional[List[str]], extra: List[str]) -> Optional[List[str]]:
+        if columns is None:
+            return None
+        return list(dict.fromkeys(list(columns) + extra))
+
+    def read(self, columns: Optional[List[str]] = None, usernames: Optional[List[str]] = None,
+             since: Optional[datetime] = None, latest_only: bool = True) -> pd.DataFrame:
+        """
+        Read rows from the store into a DataFrame
+
+        Args:
+            columns: Columns to load (default: all stored columns)
+            usernames: Only read these accounts' partitions
+            since: Only read rows whose time column is at or after this time
+            latest_only: Keep only the most recently ingested row per key
+
+        Returns:
+            pandas.DataFrame of the selected rows and columns
+        """
+        dataset = self._dataset()
+        wanted = columns or [name for name in self.schema.names if name != 'ingested_at']
+        if dataset is None:
+            return pd.DataFrame(columns=wanted)
+
+        dedupe = latest_only and self.key is not None
+        extra = [self.key, 'ingested_at'] if dedupe else []
+        table = dataset.to_table(columns=self._columns(wanted, extra),
+                                 filter=self._filter(usernames, since))
+        df = table.to_pandas()
+        if dedupe and not df.empty:
+            df = (df.sort_values('ingested_at', kind='stable')
+                  .drop_duplicates(subset=self.key, keep='last'))
+        return df[wanted].reset_index(drop=True)
+
+    def iter_batches(self, columns: Optional[List[str]] = None, batch_size: int = 100_000,
+                     usernames: Optional[List[str]] = None,
+                     since: Optional[datetime] = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream rows from the store in bounded DataFrame batches
+
+        Rows are not deduplicated across batches, so a tweet whose metrics were
+        refreshed can appear more than once.
+        """
+        dataset = self._dataset()
+        if dataset is None:
+            return
+        for batch in dataset.to_batches(columns=self._columns(columns or self.schema.names, []),
+                                        filter=self._filter(usernames, since),
+                                        batch_size=batch_size):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    def fingerprint(self) -> str:
+        """
+        Hash identifying the store's current contents
+
+        Files are never rewritten and are named uniquely, so the set of file
+        paths and sizes changes exactly when rows are appended.
+        """
+        digest = hashlib.sha256()
+        if os.path.isdir(self.root):
+            paths = sorted(os.path.join(root, name) for root, _, files in os.walk(self.root)
+                           for name in files if name.endswith('.parquet'))
+            for path in paths:
+                digest.update(f"{os.path.relpath(path, self.root)}\0{os.path.getsize(path)}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def count(self) -> int:
+        dataset = self._dataset()
+        return 0 if dataset is None else dataset.count_rows()
+
+
+def raw_store(root: str = config.RAW_STORE_PATH) -> TweetStore:
+    """Collected tweets, partitioned by account and creation date"""
+    return TweetStore(root, RAW_SCHEMA, time_column='created_at',
+                      partition_by=['username', 'date'], key='id')
+
+
+def generated_store(root: str = config.GENERATED_STORE_PATH) -> TweetStore:
+    """Generated tweets, partitioned by generation date"""
+    return TweetStore(root, GENERATED_SCHEMA, time_column='generated_at',
+                      partition_by=['date'])
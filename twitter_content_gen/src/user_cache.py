@@ -0,0 +1,115 @@
+# src/user_cache.py
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import config
+
+USER_FIELDS = ['description', 'public_metrics', 'created_at']
+MAX_USERNAMES_PER_REQUEST = 100
+
+
+class UserResolver:
+    """
+    Resolve usernames to user IDs and profiles in bulk, with an on-disk cache.
+
+    User IDs never change, so they are served from the cache indefinitely;
+    profile metrics are refetched once they are older than the TTL.
+    """
+
+    def __init__(self, client, cache_path: Optional[str] = config.USER_CACHE_PATH,
+                 ttl_seconds: float = config.USER_CACHE_TTL_SECONDS):
+        self.client = client
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._users: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable user cache {self.cache_path}: {str(e)}")
+            return {}
+
+    def _save(self) -> None:
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._users, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry.get('fetched_at', 0) < self.ttl_seconds
+
+    def _fetch(self, usernames: List[str]) -> None:
+        """Look usernames up 100 at a time and store the results in the cache"""
+        for start in range(0, len(usernames), MAX_USERNAMES_PER_REQUEST):
+            batch = usernames[start:start + MAX_USERNAMES_PER_REQUEST]
+            response = self.client.get_users(usernames=batch, user_fields=USER_FIELDS)
+            fetched_at = time.time()
+            for user in response.data or []:
+                metrics = user.public_metrics or {}
+                self._users[user.username.lower()] = {
+                    'id': user.id,
+                    'username': user.username,
+                    'description': user.description,
+                    'followers_count': metrics.get('followers_count'),
+                    'following_count': metrics.get('following_count'),
+                    'tweet_count': metrics.get('tweet_count'),
+                    'created_at': user.created_at.isoformat() if user.created_at else None,
+                    'fetched_at': fetched_at
+                }
+        self._save()
+
+    def _lookup(self, usernames: List[str], need_fresh: bool) -> Dict[str, Optional[Dict]]:
+        keys = [username.lower() for username in usernames]
+        with self._lock:
+            missing = [
+                username for username, key in zip(usernames, keys)
+                if key not in self._users or (need_fresh and not self._is_fresh(self._users[key]))
+            ]
+            if missing:
+                self._fetch(list(dict.fromkeys(missing)))
+            return {username: self._users.get(key) for username, key in zip(usernames, keys)}
+
+    def resolve_ids(self, usernames: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Map usernames to user IDs, looking up only those not cached yet
+
+        Args:
+            usernames: Twitter usernames
+
+        Returns:
+            Dictionary of username to user ID, or None for unknown users
+        """
+        entries = self._lookup(usernames, need_fresh=False)
+        return {username: entry['id'] if entry else None for username, entry in entries.items()}
+
+    def get_profiles(self, usernames: List[str]) -> Dict[str, Optional[Dict]]:
+        """
+        Get profile information for usernames, refreshing entries older than the TTL
+
+        Args:
+            usernames: Twitter usernames
+
+        Returns:
+            Dictionary of username to profile dictionary, or None for unknown users
+        """
+        profiles = {}
+        for username, entry in self._lookup(usernames, need_fresh=True).items():
+            if entry:
+                entry = {key: value for key, value in entry.items() if key != 'fetched_at'}
+                entry['username'] = username
+                if entry['created_at']:
+                    entry['created_at'] = datetime.fromisoformat(entry['created_at'])
+            profiles[username] = entry
+        return profiles
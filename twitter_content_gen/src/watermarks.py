@@ -0,0 +1,68 @@
+# src/watermarks.py
+import json
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+import pandas as pd
+
+import config
+
+
+class WatermarkStore:
+    """
+    Per-account record of the newest tweet already collected.
+
+    Later runs pass the stored ID as since_id so only newer tweets are fetched.
+    """
+
+    def __init__(self, path: Optional[str] = config.WATERMARK_PATH):
+        self.path = path
+        self._marks: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable watermark file {self.path}: {str(e)}")
+            return {}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._marks, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def since_id(self, username: str) -> Optional[int]:
+        mark = self._marks.get(username.lower())
+        return mark['since_id'] if mark else None
+
+    def since_ids(self, usernames) -> Dict[str, Optional[int]]:
+        return {username: self.since_id(username) for username in usernames}
+
+    def advance(self, username: str, tweet_id: int, created_at: Optional[datetime] = None) -> None:
+        """Move an account's watermark forward; older IDs are ignored"""
+        key = username.lower()
+        current = self._marks.get(key)
+        if current and current['since_id'] >= tweet_id:
+            return
+        self._marks[key] = {
+            'since_id': int(tweet_id),
+            'last_seen_at': pd.Timestamp(created_at).isoformat() if not pd.isna(created_at) else None,
+            'updated_at': datetime.now().isoformat()
+        }
+
+    def advance_from(self, tweets_df: pd.DataFrame) -> None:
+        """Advance every account's watermark to the newest tweet in tweets_df"""
+        if tweets_df.empty or 'id' not in tweets_df.columns:
+            return
+        with_ids = tweets_df.dropna(subset=['id'])
+        newest = with_ids.loc[with_ids.groupby('username')['id'].idxmax()]
+        for _, row in newest.iterrows():
+            self.advance(row['username'], int(row['id']), row.get('created_at'))
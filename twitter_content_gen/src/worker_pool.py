@@ -0,0 +1,265 @@
+# src/worker_pool.py
+import argparse
+import math
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import backends
+import config
+from topic_index import TopicIndex
+
+# Read by the BLAS/OpenMP runtimes when a worker imports numpy and torch
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+def _worker_main(worker_id: int, model_name: str, draft_model: Optional[str], threads: int,
+                 cores: Optional[List[int]], jobs, results) -> None:
+    import torch
+
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    from tweet_generator import TweetGenerator
+
+    generator = TweetGenerator(model_name, backend='shared', draft_model=draft_model)
+    generator._load()
+    results.put((worker_id, None, None, None))
+
+    index = None
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, new_index, n, kwargs = job
+        if new_index is not None:
+            index = new_index
+        try:
+            results.put((worker_id, job_id, generator.generate_batch(index, n=n, **kwargs), None))
+        except Exception as e:
+            results.put((worker_id, job_id, None, f"{type(e).__name__}: {str(e)}"))
+
+
+class _Worker:
+    def __init__(self, process, jobs):
+        self.process = process
+        self.jobs = jobs
+        self.outstanding: Dict[int, Future] = {}
+        self.pending_tweets = 0
+        self.index = None
+
+
+class WorkerPool:
+    """
+    Generation processes sharing one read-only copy of the model weights.
+
+    The weights are exported once as safetensors (the 'shared' backend) and
+    memory-mapped by every worker, so extra workers add little beyond their
+    activations. Each worker runs a fixed number of torch threads, pinned to
+    its own cores where the platform allows. A dispatcher sends every job to
+    the worker with the fewest tweets outstanding.
+
+    Exposes generate_batch() like TweetGenerator, so it can stand in for one,
+    e.g. behind the generation server's DynamicBatcher.
+    """
+
+    def __init__(self, model_name: str = config.MODEL_NAME, workers: int = config.GENERATION_WORKERS,
+                 threads_per_worker: Optional[int] = config.WORKER_THREADS,
+                 draft_model: Optional[str] = config.SPECULATIVE_DRAFT_MODEL):
+        cores = os.cpu_count() or 1
+        self.model_name = model_name
+        self.draft_model = draft_model
+        self.workers = workers or cores
+        self.threads_per_worker = threads_per_worker or max(1, cores // self.workers)
+        self._workers: List[_Worker] = []
+        self._results = None
+        self._lock = threading.Lock()
+        self._job_ids = 0
+        self._collector = None
+        self._stopped = threading.Event()
+        self._index_source = None
+        self._index = None
+
+    def start(self) -> 'WorkerPool':
+        """Export the shared weights if needed, then start the workers and wait until they are loaded"""
+        for name in filter(None, (self.model_name, self.draft_model)):
+            if not os.path.exists(os.path.join(backends.converted_path(name, 'shared'), backends.SHARED_WEIGHTS)):
+                backends.convert(name, 'shared')
+
+        context = mp.get_context('spawn')
+        self._results = context.Queue()
+        cores = os.cpu_count() or 1
+        pin = hasattr(os, 'sched_setaffinity') and self.workers * self.threads_per_worker <= cores
+
+        saved_env = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+        os.environ.update({name: str(self.threads_per_worker) for name in THREAD_ENV_VARS})
+        try:
+            for worker_id in range(self.workers):
+                worker_cores = (list(range(worker_id * self.threads_per_worker,
+                                           (worker_id + 1) * self.threads_per_worker)) if pin else None)
+                jobs = context.Queue()
+                process = context.Process(
+                    target=_worker_main, name=f"generation-worker-{worker_id}", daemon=True,
+                    args=(worker_id, self.model_name, self.draft_model, self.threads_per_worker,
+                          worker_cores, jobs, self._results)
+                )
+                process.start()
+                self._workers.append(_Worker(process, jobs))
+        finally:
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+        ready = 0
+        while ready < self.workers:
+            try:
+                worker_id, job_id, _, _ = self._results.get(timeout=1)
+                ready += job_id is None
+            except queue.Empty:
+                if any(not worker.process.is_alive() for worker in self._workers):
+                    self.stop()
+                    raise RuntimeError("A generation worker exited while loading the model")
+
+        self._collector = threading.Thread(target=self._collect, name='worker-pool-results', daemon=True)
+        self._collector.start()
+        print(f"Started {self.workers} generation workers with {self.threads_per_worker} threads each")
+        return self
+
+    def _collect(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                worker_id, job_id, results, error = self._results.get(timeout=1)
+            except queue.Empty:
+                self._fail_dead_workers()
+                continue
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                # Results can still arrive while stop() tears the workers down
+                if worker_id >= len(self._workers):
+                    continue
+                worker = self._workers[worker_id]
+                future = worker.outstanding.pop(job_id, None)
+                if future is not None:
+                    worker.pending_tweets -= future.n
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(results)
+
+    def _fail_dead_workers(self) -> None:
+        with self._lock:
+            for worker in self._workers:
+                if worker.outstanding and not worker.process.is_alive():
+                    for future in worker.outstanding.values():
+                        future.set_exception(RuntimeError(f"{worker.process.name} exited"))
+                    worker.outstanding.clear()
+                    worker.pending_tweets = 0
+
+    def _topic_index(self, tweets_df) -> TopicIndex:
+        # Workers only ever receive the compact topic index, never the corpus itself
+        if isinstance(tweets_df, TopicIndex):
+            return tweets_df
+        if tweets_df is not self._index_source:
+            self._index = TopicIndex.from_dataframe(tweets_df)
+            self._index_source = tweets_df
+        return self._index
+
+    def submit(self, tweets_df, n: int = 1, **kwargs) -> Future:
+        """
+        Queue a job for n tweets on the least loaded worker
+
+        Args:
+            tweets_df: DataFrame of collected tweets, or a prebuilt TopicIndex
+            n: Number of tweets to generate
+            **kwargs: Passed on to TweetGenerator.generate_batch
+
+        Returns:
+            Future resolving to the list of n result dicts
+        """
+        if not self._workers:
+            raise RuntimeError("The worker pool is not running; call start() first")
+        index = self._topic_index(tweets_df)
+        future = Future()
+        future.n = n
+        with self._lock:
+            worker = min((w for w in self._workers if w.process.is_alive()),
+                         key=lambda w: w.pending_tweets, default=None)
+            if worker is None:
+                raise RuntimeError("No generation worker is running")
+            self._job_ids += 1
+            worker.outstanding[self._job_ids] = future
+            worker.pending_tweets += n
+            # A worker keeps the last index it was sent, so each index crosses the process boundary once
+            new_index = index if worker.index is not index else None
+            worker.index = index
+            worker.jobs.put((self._job_ids, new_index, n, kwargs))
+        return future
+
+    def generate_batch(self, tweets_df, n: int = 3, **kwargs) -> List[Dict]:
+        """Generate n tweets, split evenly across the workers; same results as TweetGenerator.generate_batch"""
+        if n <= 0:
+            return []
+        per_worker = math.ceil(n / self.workers)
+        futures = [self.submit(tweets_df, min(per_worker, n - start), **kwargs)
+                   for start in range(0, n, per_worker)]
+        return [result for future in futures for result in future.result()]
+
+    def generate_tweet(self, tweets_df, max_length: int = 280) -> Dict:
+        return self.submit(tweets_df, 1, max_length=max_length).result()[0]
+
+    def stop(self) -> None:
+        self._stopped.set()
+        for worker in self._workers:
+            if worker.process.is_alive():
+                worker.jobs.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        if self._collector is not None:
+            self._collector.join()
+            self._collector = None
+        # Nothing will resolve the jobs still queued or running, so callers waiting on them must not hang
+        with self._lock:
+            for worker in self._workers:
+                for future in worker.outstanding.values():
+                    future.set_exception(RuntimeError("The worker pool was stopped"))
+            self._workers = []
+
+    def __enter__(self) -> 'WorkerPool':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Measure tweet generation throughput of a worker pool")
+    parser.add_argument('--model', default=config.MODEL_NAME, help="Model name or checkpoint path")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--threads', type=int, default=None, help="Torch threads per worker")
+    parser.add_argument('--tweets', type=int, default=64)
+    parser.add_argument('--corpus', default='data/raw/test_tweets.csv',
+                        help="CSV of collected tweets to take topics from")
+    args = parser.parse_args()
+
+    index = TopicIndex.from_dataframe(pd.read_csv(args.corpus))
+    with WorkerPool(args.model, args.workers, args.threads) as pool:
+        pool.generate_batch(index, n=pool.workers)  # Warm-up
+        start = time.perf_counter()
+        pool.generate_batch(index, n=args.tweets)
+        elapsed = time.perf_counter() - start
+    print(f"{args.tweets} tweets in {elapsed:.1f}s ({args.tweets / elapsed:.2f} tweets/s)")